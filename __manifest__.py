@@ -1,6 +1,6 @@
 {
     'name': 'Restricciones Entregas - Fecha Entrega Hexagonos',
-    'version': '18.0.4.1',
+    'version': '18.0.4.3',
     'category': 'Sales',
     'summary': 'Configurar fecha de entrega por defecto a 15 días',
     'description': """
@@ -17,6 +17,8 @@
         'security/security.xml',
         'security/delivery_evidence_security.xml',
         'security/ir.model.access.csv',
+        'data/ir_cron.xml',
+        'data/ir_config_parameter.xml',
         'views/sale_order_views.xml',
         'views/sale_order_line_delivery_report_views.xml',
         'views/delivery_evidence_views.xml',
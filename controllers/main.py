@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Rutas HTTP del Centro de operación de Entregas y Evidencias.
+
+Los archivos se suben en binario (multipart) en lugar de base64 por
+JSON-RPC: no se infla el tamaño y el archivo pasa a disco cuando crece.
+Las evidencias se copian por bloques directo al filestore.
+"""
+import hashlib
+import shutil
+import tempfile
+
+from odoo import http, _
+from odoo.exceptions import AccessError, UserError
+from odoo.http import request
+
+# Hasta este tamaño el archivo subido se queda en memoria; arriba, a disco.
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# Tope por evidencia: un PDF escaneado o una foto nunca debería acercarse.
+EVIDENCE_MAX_SIZE = 100 * 1024 * 1024
+
+
+class DeliveryEvidenceController(http.Controller):
+
+    @http.route('/restricciones_entregas/match_excel', type='http', auth='user',
+                methods=['POST'])
+    def match_excel(self, file, **kwargs):
+        """Empata un Excel/CSV de Administración contra los controles."""
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            shutil.copyfileobj(file.stream, spool)
+            spool.seek(0)
+            try:
+                result = request.env['delivery.evidence.control']._match_excel_stream(
+                    spool, file.filename)
+            except UserError as error:
+                return request.make_json_response({'error': str(error)}, status=400)
+        return request.make_json_response(result)
+
+    @http.route('/restricciones_entregas/upload_evidence', type='http', auth='user',
+                methods=['POST'])
+    def upload_evidence(self, file, control_id, **kwargs):
+        """Sube una evidencia en binario; la app manda varias en paralelo.
+
+        El archivo se copia por bloques del stream de la subida al filestore,
+        calculando la huella en el camino: nunca se carga completo en memoria.
+        EVIDENCE_MAX_SIZE se revisa durante esa copia; antes, Werkzeug ya
+        dejó el cuerpo multipart en un temporal y solo lo limita el tope
+        general de peticiones del servidor.
+        """
+        control = request.env['delivery.evidence.control'].browse(int(control_id)).exists()
+        if not control:
+            return request.make_json_response(
+                {'error': _('El control ya no existe.')}, status=404)
+        try:
+            with request.env.cr.savepoint():
+                vals = {
+                    'file_name': file.filename,
+                    'name': kwargs.get('name'),
+                    'evidence_type': kwargs.get('evidence_type'),
+                }
+                sha256 = hashlib.sha256()
+                stored = request.env['ir.attachment']._stream_to_store(
+                    file.stream, hashers=[sha256], max_size=EVIDENCE_MAX_SIZE)
+                doc, duplicate = control._add_evidence_stored(stored, sha256.hexdigest(), vals)
+        except (AccessError, UserError) as error:
+            return request.make_json_response({'error': str(error)}, status=400)
+        return request.make_json_response({
+            'document_id': doc.id,
+            'duplicate': duplicate and control._js_duplicate(duplicate, vals) or False,
+        })
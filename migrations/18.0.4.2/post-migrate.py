@@ -0,0 +1,22 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Construye el índice de identificadores (delivery.evidence.identifier)
+    de los controles existentes, por bloques para acotar la memoria."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Control = env['delivery.evidence.control'].with_context(active_test=False)
+    control_ids = Control.search([]).ids
+    for batch_ids in split_every(1000, control_ids):
+        Control.browse(batch_ids)._sync_identifiers()
+        env.flush_all()
+        env.invalidate_all()
+    _logger.info(
+        "restricciones_entregas 18.0.4.2: índice de identificadores construido "
+        "para %s controles.", len(control_ids),
+    )
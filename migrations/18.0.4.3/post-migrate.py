@@ -0,0 +1,30 @@
+import hashlib
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Calcula la huella SHA-256 de las evidencias ya cargadas, por bloques
+    para acotar la memoria (cada bloque lee sus archivos del filestore)."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Document = env['delivery.evidence.document']
+    doc_ids = Document.search([('file_sha256', '=', False)]).ids
+    for batch_ids in split_every(200, doc_ids):
+        attachments = env['ir.attachment'].search([
+            ('res_model', '=', Document._name),
+            ('res_field', '=', 'file'),
+            ('res_id', 'in', batch_ids),
+        ])
+        for attachment in attachments:
+            Document.browse(attachment.res_id).file_sha256 = hashlib.sha256(
+                attachment.raw or b'').hexdigest()
+        env.flush_all()
+        env.invalidate_all()
+    _logger.info(
+        "restricciones_entregas 18.0.4.3: huella calculada para %s evidencias.",
+        len(doc_ids),
+    )
@@ -1,3 +1,7 @@
+from . import ir_attachment
+from . import res_users
 from . import sale_order
 from . import sale_order_line
-from . import delivery_evidence
\ No newline at end of file
+from . import delivery_evidence
+from . import delivery_evidence_sync_job
+from . import delivery_evidence_report_job
\ No newline at end of file
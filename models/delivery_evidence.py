@@ -15,13 +15,23 @@ ancla en la ORDEN DE VENTA (el folio de seguimiento de la casa):
   validación y envío a Administración.
 """
 import base64
+import codecs
+import csv
+import hashlib
 import io
 import logging
 import re
+from collections import defaultdict
 from datetime import timedelta
 
+import pytz
+from PIL import Image
+
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from odoo.osv import expression
+from odoo.tools import float_compare, image_process, split_every, str2bool
+from odoo.tools.mimetypes import guess_mimetype
 
 _logger = logging.getLogger(__name__)
 
@@ -41,6 +51,47 @@ DOC_STATES = [
     ('sent', 'Enviado a Administración'),
 ]
 
+# Forma de un folio de venta o de producción ya en minúsculas
+# (s10978, s10978-2, f/1234): distingue folios de texto libre.
+FOLIO_PATTERN = re.compile(r'^[a-z]{0,6}[\-/]?\d{3,}([\-/]\d+)?$')
+
+# Tokens del Excel que se empatan por consulta al índice de identificadores.
+MATCH_CHUNK_SIZE = 1000
+
+# Normalización de fotos de evidencia; se ajusta con los parámetros del
+# sistema restricciones_entregas.evidence_image_* (ver data/ir_config_parameter.xml).
+IMAGE_PARAM_PREFIX = 'restricciones_entregas.evidence_image_'
+IMAGE_DEFAULTS = {'process': 'True', 'max_px': '2400', 'quality': '85', 'keep_original': 'False'}
+IMAGE_MIMETYPES = ('image/jpeg', 'image/png')
+THUMBNAIL_PX = 256
+# Fotos más pesadas que esto se adjuntan sin normalizar (no se leen a memoria).
+IMAGE_MAX_BYTES = 25 * 1024 * 1024
+
+
+def _changed_values(record, vals, digits):
+    """Subconjunto de vals que difiere de lo ya guardado en record."""
+    changes = {}
+    for name, value in vals.items():
+        field = record._fields[name]
+        current = record[name]
+        if field.type == 'many2one':
+            same = current.id == (value or False)
+        elif field.type == 'float':
+            same = not float_compare(current, value, precision_digits=digits)
+        else:
+            same = current == value
+        if not same:
+            changes[name] = value
+    return changes
+
+
+def _leaf_matches(values, leaf):
+    """Evalúa en Python una hoja ('campo', '=' | 'in', valor) de TAB_DOMAINS."""
+    name, operator, value = leaf
+    if operator == 'in':
+        return values[name] in value
+    return values[name] == value
+
 
 class DeliveryEvidenceControl(models.Model):
     _name = 'delivery.evidence.control'
@@ -56,7 +107,7 @@ class DeliveryEvidenceControl(models.Model):
         'sale.order', 'Orden de venta', required=True, index=True,
         ondelete='restrict',
     )
-    name = fields.Char('Folio', related='sale_order_id.name', store=True)
+    name = fields.Char('Folio', related='sale_order_id.name', store=True, index='trigram')
     company_id = fields.Many2one(related='sale_order_id.company_id', store=True, index=True)
     partner_id = fields.Many2one(related='sale_order_id.partner_id', store=True, string='Cliente')
     partner_code = fields.Char(
@@ -68,9 +119,11 @@ class DeliveryEvidenceControl(models.Model):
     order_state = fields.Selection(related='sale_order_id.state', string='Estado venta', store=True)
     client_order_ref = fields.Char(
         'OC del cliente', related='sale_order_id.client_order_ref', store=True,
+        index='trigram',
     )
     production_folios = fields.Char(
         'Folios de producción', compute='_compute_sale_links', store=True,
+        index='trigram',
         help='Folios por línea de venta (multi-folio): cada consecutivo '
              'S10978-1, S10978-2… es un folio de producción independiente.',
     )
@@ -88,7 +141,7 @@ class DeliveryEvidenceControl(models.Model):
     # Factura Compact (control alterno: captura manual, sin vínculo contable)
     # ------------------------------------------------------------------
     compact_invoice_folio = fields.Char(
-        'Factura Compact', tracking=True,
+        'Factura Compact', tracking=True, index='trigram',
         help='Serie y folio de la factura emitida en CONTPAQi. Captura manual: '
              'esta instancia de Odoo no factura.',
     )
@@ -177,58 +230,100 @@ class DeliveryEvidenceControl(models.Model):
         qty_delivered de la línea de venta ya es el neto real de las
         remisiones validadas menos devoluciones (lo mantiene Odoo desde los
         movimientos de inventario). Solo lectura: no toca ventas ni stock.
+
+        Trabaja por conjuntos sobre todo el recordset: el detalle existente
+        se empata contra las líneas de venta por sale_line_id y solo se
+        crea, actualiza o elimina lo que cambió, con un create/write/unlink
+        agrupado en lugar de borrar y recrear todo en cada actualización.
         """
         Line = self.env['delivery.evidence.control.line']
+        digits = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+
+        current = {}
+        obsolete_ids = []
+        for line in self.line_ids:
+            key = (line.control_id.id, line.sale_line_id.id)
+            if not line.sale_line_id or key in current:
+                obsolete_ids.append(line.id)
+            else:
+                current[key] = line
+
+        lines_to_create = []
+        line_writes = defaultdict(list)
+        control_writes = defaultdict(list)
         for control in self:
             order = control.sale_order_id
-            control.line_ids.unlink()
 
             if order.state == 'cancel':
-                control.write({
+                vals = {
                     'delivery_state': 'cancelled',
                     'qty_ordered': 0.0, 'qty_delivered': 0.0, 'qty_pending': 0.0,
                     'delivered_pct': 0.0, 'review_reason': False,
-                })
-                continue
-
-            totals = {'ord': 0.0, 'dlv': 0.0, 'pen': 0.0}
-            product_lines = order.order_line.filtered(
-                lambda l: not l.display_type and l.product_id)
-            for sale_line in product_lines:
-                ordered = sale_line.product_uom_qty
-                delivered = sale_line.qty_delivered
-                pending = max(ordered - delivered, 0.0)
-                Line.create({
-                    'control_id': control.id,
-                    'sale_line_id': sale_line.id,
-                    'product_id': sale_line.product_id.id,
-                    'uom_id': sale_line.product_uom.id,
-                    'qty_ordered': ordered,
-                    'qty_delivered': delivered,
-                    'qty_pending': pending,
-                })
-                totals['ord'] += ordered
-                totals['dlv'] += delivered
-                totals['pen'] += pending
-
-            rounding = 0.001
-            if not product_lines:
-                state, reason = 'review', _('La orden no tiene líneas de producto.')
-            elif totals['pen'] <= rounding:
-                state, reason = 'delivered', False
-            elif totals['dlv'] > rounding:
-                state, reason = 'partial', False
+                }
             else:
-                state, reason = 'pending', False
-
-            control.write({
-                'qty_ordered': totals['ord'],
-                'qty_delivered': totals['dlv'],
-                'qty_pending': totals['pen'],
-                'delivered_pct': (100.0 * totals['dlv'] / totals['ord']) if totals['ord'] else 0.0,
-                'delivery_state': state,
-                'review_reason': reason,
-            })
+                totals = {'ord': 0.0, 'dlv': 0.0, 'pen': 0.0}
+                product_lines = order.order_line.filtered(
+                    lambda l: not l.display_type and l.product_id)
+                for sale_line in product_lines:
+                    ordered = sale_line.product_uom_qty
+                    delivered = sale_line.qty_delivered
+                    pending = max(ordered - delivered, 0.0)
+                    line_vals = {
+                        'product_id': sale_line.product_id.id,
+                        'uom_id': sale_line.product_uom.id,
+                        'qty_ordered': ordered,
+                        'qty_delivered': delivered,
+                        'qty_pending': pending,
+                    }
+                    line = current.pop((control.id, sale_line.id), None)
+                    if line is None:
+                        lines_to_create.append(dict(
+                            line_vals, control_id=control.id, sale_line_id=sale_line.id))
+                    else:
+                        changes = _changed_values(line, line_vals, digits)
+                        if changes:
+                            line_writes[tuple(sorted(changes.items()))].append(line.id)
+                    totals['ord'] += ordered
+                    totals['dlv'] += delivered
+                    totals['pen'] += pending
+
+                rounding = 0.001
+                if not product_lines:
+                    state, reason = 'review', _('La orden no tiene líneas de producto.')
+                elif totals['pen'] <= rounding:
+                    state, reason = 'delivered', False
+                elif totals['dlv'] > rounding:
+                    state, reason = 'partial', False
+                else:
+                    state, reason = 'pending', False
+
+                vals = {
+                    'qty_ordered': totals['ord'],
+                    'qty_delivered': totals['dlv'],
+                    'qty_pending': totals['pen'],
+                    'delivered_pct': (100.0 * totals['dlv'] / totals['ord']) if totals['ord'] else 0.0,
+                    'delivery_state': state,
+                    'review_reason': reason,
+                }
+
+            changes = _changed_values(control, vals, digits)
+            if changes:
+                control_writes[tuple(sorted(changes.items()))].append(control.id)
+
+        # Lo que no empató con ninguna línea de venta vigente sobra (líneas
+        # eliminadas de la venta, sin producto, o ventas canceladas).
+        obsolete_ids += [line.id for line in current.values()]
+        if obsolete_ids:
+            Line.browse(obsolete_ids).unlink()
+        for changes, line_ids in line_writes.items():
+            Line.browse(line_ids).write(dict(changes))
+        if lines_to_create:
+            Line.create(lines_to_create)
+        # Un write por combinación de valores: los controles que llegan al
+        # mismo estado (p. ej. todos los cancelados) se escriben juntos.
+        for changes, control_ids in control_writes.items():
+            self.browse(control_ids).write(dict(changes))
+        self._sync_identifiers()
 
     def _update_evidence_stage(self):
         """Etapas automáticas de evidencia (no toca ready/sent, que son acciones)."""
@@ -251,26 +346,50 @@ class DeliveryEvidenceControl(models.Model):
     # ==================================================================
     @api.model
     def _sync_from_orders(self, orders):
-        """Crea/actualiza controles para las ventas dadas. Idempotente."""
+        """Crea/actualiza controles para las ventas dadas. Idempotente.
+
+        Procesa el lote completo de una vez: precarga las líneas y
+        remisiones de todas las ventas, crea los controles faltantes en un
+        solo create() y refresca todos los controles tocados como un único
+        recordset.
+        """
         stats = {'created': 0, 'updated': 0, 'skipped': 0, 'review': 0}
+        buckets = defaultdict(list)
+        for order in orders:
+            buckets[order.state in ('sale', 'done', 'cancel')].append(order.id)
+        stats['skipped'] = len(buckets[False])
+        targets = orders.browse(buckets[True])
+        if not targets:
+            return stats
+
+        targets.fetch(['state', 'order_line', 'picking_ids'])
+        targets.order_line.fetch([
+            'display_type', 'product_id', 'product_uom',
+            'product_uom_qty', 'qty_delivered',
+        ])
+
         existing = {
-            c.sale_order_id.id: c
+            c.sale_order_id.id: c.id
             for c in self.with_context(active_test=False).search(
-                [('sale_order_id', 'in', orders.ids)])
+                [('sale_order_id', 'in', targets.ids)])
         }
-        for order in orders:
-            if order.state not in ('sale', 'done', 'cancel'):
-                stats['skipped'] += 1
-                continue
-            control = existing.get(order.id)
-            if control:
-                control._update_from_source()
-                stats['updated'] += 1
-            else:
-                control = self.create({'sale_order_id': order.id})
-                control._update_from_source()
+        missing_ids = [oid for oid in dict.fromkeys(targets.ids) if oid not in existing]
+        created = self.create([{'sale_order_id': oid} for oid in missing_ids])
+        existing.update(zip(missing_ids, created.ids))
+
+        controls = self.browse(dict.fromkeys(existing[oid] for oid in targets.ids))
+        controls._update_from_source()
+
+        created_ids = set(created.ids)
+        review_ids = set(controls.filtered(lambda c: c.delivery_state == 'review').ids)
+        for order_id in targets.ids:
+            control_id = existing[order_id]
+            if control_id in created_ids:
+                created_ids.discard(control_id)
                 stats['created'] += 1
-            if control.delivery_state == 'review':
+            else:
+                stats['updated'] += 1
+            if control_id in review_ids:
                 stats['review'] += 1
         return stats
 
@@ -278,7 +397,7 @@ class DeliveryEvidenceControl(models.Model):
     # Acciones
     # ==================================================================
     def _is_manager(self):
-        return self.env.user.has_group('restricciones_entregas.group_delivery_evidence_manager')
+        return self.env.user._delivery_permissions()['evidence_manager']
 
     def action_refresh(self):
         self._update_from_source()
@@ -375,6 +494,75 @@ class DeliveryEvidenceControl(models.Model):
             'domain': [('id', 'in', self.picking_ids.ids)],
         }
 
+    # ==================================================================
+    # Índice de identificadores (para empatar Excel)
+    # ==================================================================
+    IDENTIFIER_FIELDS = ['name', 'client_order_ref', 'compact_invoice_folio', 'production_folios']
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        controls = super().create(vals_list)
+        controls._sync_identifiers()
+        return controls
+
+    def write(self, vals):
+        res = super().write(vals)
+        if set(self.IDENTIFIER_FIELDS) & vals.keys():
+            self._sync_identifiers()
+        return res
+
+    def _get_identifiers(self):
+        """Identificadores normalizados con los que se reconoce el control."""
+        self.ensure_one()
+        identifiers = [self.name, self.client_order_ref, self.compact_invoice_folio]
+        identifiers += (self.production_folios or '').split(', ')
+        return {i.strip().lower() for i in identifiers if i and i.strip()}
+
+    def _sync_identifiers(self):
+        """Actualiza delivery.evidence.identifier para estos controles.
+
+        Se llama al crear/escribir el control, al refrescarlo desde la venta
+        y cuando la venta cambia folio, OC o líneas (incluidas las líneas
+        eliminadas o renumeradas directamente); solo crea y elimina las
+        diferencias.
+        """
+        Identifier = self.env['delivery.evidence.identifier'].sudo()
+        existing = defaultdict(dict)
+        for row in Identifier.search([('control_id', 'in', self.ids)]):
+            existing[row.control_id.id][row.identifier] = row.id
+        to_create, obsolete_ids = [], []
+        for control in self:
+            wanted = control._get_identifiers()
+            current = existing.get(control.id, {})
+            to_create += [
+                {'control_id': control.id, 'identifier': identifier}
+                for identifier in wanted - current.keys()
+            ]
+            obsolete_ids += [rid for identifier, rid in current.items() if identifier not in wanted]
+        if obsolete_ids:
+            Identifier.browse(obsolete_ids).unlink()
+        if to_create:
+            Identifier.create(to_create)
+
+    @api.model
+    def _match_identifiers(self, tokens):
+        """{token: control} para los tokens (normalizados) que coinciden.
+
+        Una sola consulta por identificador sobre el índice: el costo sigue
+        al tamaño del Excel, no al de la base. Si un identificador apunta a
+        varios controles gana el primero según _order.
+        """
+        rows = self.env['delivery.evidence.identifier'].search(
+            [('identifier', 'in', list(tokens))])
+        by_control = defaultdict(list)
+        for row in rows:
+            by_control[row.control_id.id].append(row.identifier)
+        index = {}
+        for control in self.search([('id', 'in', list(by_control))]):
+            for identifier in by_control[control.id]:
+                index.setdefault(identifier, control)
+        return index
+
     def unlink(self):
         if any(c.doc_state == 'sent' for c in self) and not self._is_manager():
             raise UserError(_('Un control enviado a Administración no se puede eliminar.'))
@@ -393,17 +581,31 @@ class DeliveryEvidenceControl(models.Model):
         'review': [('delivery_state', '=', 'review')],
     }
 
+    @api.model
+    def _tab_counts(self):
+        """Conteo de todas las pestañas con una sola agregación.
+
+        Las pestañas solo filtran por delivery_state y doc_state: se agrupa
+        una vez por ambos campos y cada pestaña suma las celdas de la matriz
+        que cumplen su dominio.
+        """
+        counts = dict.fromkeys(self.TAB_DOMAINS, 0)
+        for delivery_state, doc_state, count in self._read_group(
+                [], ['delivery_state', 'doc_state'], ['__count']):
+            values = {'delivery_state': delivery_state, 'doc_state': doc_state}
+            for tab, domain in self.TAB_DOMAINS.items():
+                if all(_leaf_matches(values, leaf) for leaf in domain):
+                    counts[tab] += count
+        return counts
+
     @api.model
     def js_bootstrap(self):
-        counts = {
-            tab: self.search_count(domain)
-            for tab, domain in self.TAB_DOMAINS.items()
-        }
+        counts = self._tab_counts()
         return {
             'user_name': self.env.user.name,
-            'is_manager': self.env.user.has_group(
-                'restricciones_entregas.group_delivery_evidence_manager'),
+            'is_manager': self.env.user._delivery_permissions()['evidence_manager'],
             'counts': counts,
+            'reports': self.env['delivery.evidence.report.job']._js_recent(),
             'evidence_types': [
                 {'value': v, 'label': l}
                 for v, l in self.env['delivery.evidence.document']._fields['evidence_type'].selection
@@ -411,48 +613,137 @@ class DeliveryEvidenceControl(models.Model):
         }
 
     @api.model
-    def js_list(self, tab='all', search='', limit=120):
+    def _js_list_domain(self, tab='all', search=''):
+        """Dominio de la lista. Un término con forma de folio (S10978-2,
+        F-1234) solo se busca en las columnas con índice trigram; el resto
+        también busca por cliente."""
         domain = list(self.TAB_DOMAINS.get(tab, []))
-        if search:
-            term = search.strip()
-            domain += ['|', '|', '|', '|',
-                       ('name', 'ilike', term),
-                       ('partner_id', 'ilike', term),
-                       ('client_order_ref', 'ilike', term),
-                       ('production_folios', 'ilike', term),
-                       ('compact_invoice_folio', 'ilike', term)]
-        controls = self.search(domain, limit=limit, order='order_date desc, id desc')
-        return [c._js_row() for c in controls]
+        term = (search or '').strip()
+        if not term:
+            return domain
+        leaves = [
+            [('name', 'ilike', term)],
+            [('production_folios', 'ilike', term)],
+            [('client_order_ref', 'ilike', term)],
+            [('compact_invoice_folio', 'ilike', term)],
+        ]
+        if not FOLIO_PATTERN.match(term.lower()):
+            leaves.append([('partner_id', 'ilike', term)])
+        return expression.AND([domain, expression.OR(leaves)])
 
-    def _js_row(self):
-        self.ensure_one()
+    @api.model
+    def _keyset_domain(self, order_date, record_id):
+        """Renglones posteriores a (order_date, id) en el orden de _order.
+
+        En 'order_date desc' PostgreSQL pone primero los NULL, así que
+        después de un renglón sin fecha siguen los demás sin fecha con id
+        menor y luego todos los fechados.
+        """
+        if order_date:
+            return ['|', ('order_date', '<', order_date),
+                    '&', ('order_date', '=', order_date), ('id', '<', record_id)]
+        return ['|', ('order_date', '!=', False),
+                '&', ('order_date', '=', False), ('id', '<', record_id)]
+
+    @api.model
+    def js_list(self, tab='all', search='', limit=80, cursor=None):
+        """Página de la lista con paginación por llave (order_date, id).
+
+        cursor es el par [order_date, id] del último renglón recibido: la
+        página siguiente arranca justo después, sin OFFSET. El total solo
+        se cuenta al pedir la primera página.
+        """
+        domain = self._js_list_domain(tab, search)
+        page_domain = expression.AND([domain, self._keyset_domain(*cursor)]) if cursor else domain
+        controls = self.search(page_domain, limit=limit + 1, order=self._order)
+        next_cursor = False
+        if len(controls) > limit:
+            controls = controls[:limit]
+            last = controls[-1]
+            next_cursor = [fields.Date.to_string(last.order_date), last.id]
         return {
-            'id': self.id,
-            'name': self.name or '',
-            'partner': self.partner_id.name or '',
-            'partner_code': self.partner_code or '',
-            'date': self.order_date and self.order_date.strftime('%d/%m/%Y') or '',
-            'amount_total': self.amount_total,
-            'currency': self.currency_id.name or 'MXN',
-            'qty_ordered': self.qty_ordered,
-            'qty_delivered': self.qty_delivered,
-            'qty_pending': self.qty_pending,
-            'pct': round(self.delivered_pct, 1),
-            'delivery_state': self.delivery_state,
-            'doc_state': self.doc_state,
-            'days': self.days_without_evidence,
-            'folios': self.production_folios or '',
-            'oc': self.client_order_ref or '',
-            'compact_folio': self.compact_invoice_folio or '',
-            'evidence_count': len(self.evidence_ids),
-            'sent_date': self.sent_date and fields.Datetime.context_timestamp(
-                self, self.sent_date).strftime('%d/%m/%Y') or '',
-            'exception': self.ready_exception,
+            'rows': controls._js_rows(),
+            'total': False if cursor else self.search_count(domain),
+            'next_cursor': next_cursor,
         }
 
+    JS_ROW_FIELDS = [
+        'name', 'partner_id', 'partner_code', 'order_date', 'amount_total', 'currency_id',
+        'qty_ordered', 'qty_delivered', 'qty_pending', 'delivered_pct', 'delivery_state',
+        'doc_state', 'production_folios', 'client_order_ref', 'compact_invoice_folio',
+        'sent_date', 'ready_exception',
+    ]
+
+    def _get_user_tz(self):
+        """Zona horaria del usuario (como context_timestamp), resuelta una vez."""
+        tz_name = self.env.context.get('tz') or self.env.user.tz
+        try:
+            return pytz.timezone(tz_name) if tz_name else pytz.utc
+        except pytz.UnknownTimeZoneError:
+            return pytz.utc
+
+    def _js_rows(self):
+        """Serializa el recordset para la app en una sola pasada.
+
+        Una lectura columnar de los controles, nombres de cliente y moneda
+        resueltos en bloque, un conteo agrupado de evidencias, y una sola
+        fecha de hoy y zona horaria para todos los renglones.
+        """
+        if not self:
+            return []
+        records = self.read(self.JS_ROW_FIELDS, load=None)
+        partner_names = {p.id: p.name for p in self.env['res.partner'].browse(
+            {r['partner_id'] for r in records if r['partner_id']})}
+        currency_names = {c.id: c.name for c in self.env['res.currency'].browse(
+            {r['currency_id'] for r in records if r['currency_id']})}
+        evidence_counts = {
+            control.id: count
+            for control, count in self.env['delivery.evidence.document']._read_group(
+                [('control_id', 'in', self.ids)], ['control_id'], ['__count'])
+        }
+        today = fields.Date.context_today(self)
+        tz = self._get_user_tz()
+
+        rows = []
+        for r in records:
+            days = 0
+            if r['doc_state'] in ('no_evidence', 'partial_evidence') and r['order_date']:
+                days = (today - r['order_date']).days
+            rows.append({
+                'id': r['id'],
+                'name': r['name'] or '',
+                'partner': partner_names.get(r['partner_id']) or '',
+                'partner_code': r['partner_code'] or '',
+                'date': r['order_date'] and r['order_date'].strftime('%d/%m/%Y') or '',
+                'amount_total': r['amount_total'],
+                'currency': currency_names.get(r['currency_id']) or 'MXN',
+                'qty_ordered': r['qty_ordered'],
+                'qty_delivered': r['qty_delivered'],
+                'qty_pending': r['qty_pending'],
+                'pct': round(r['delivered_pct'], 1),
+                'delivery_state': r['delivery_state'],
+                'doc_state': r['doc_state'],
+                'days': days,
+                'folios': r['production_folios'] or '',
+                'oc': r['client_order_ref'] or '',
+                'compact_folio': r['compact_invoice_folio'] or '',
+                'evidence_count': evidence_counts.get(r['id'], 0),
+                'sent_date': r['sent_date'] and pytz.utc.localize(
+                    r['sent_date']).astimezone(tz).strftime('%d/%m/%Y') or '',
+                'exception': r['ready_exception'],
+            })
+        return rows
+
+    def _js_row(self):
+        self.ensure_one()
+        return self._js_rows()[0]
+
     def js_detail(self):
         self.ensure_one()
         data = self._js_row()
+        tz = self._get_user_tz()
+        # Con bin_size solo se consulta si hay miniatura, no su contenido.
+        thumbnail_ids = set(self.evidence_ids.with_context(bin_size=True).filtered('thumbnail').ids)
         data.update({
             'order_state': self.order_state,
             'review_reason': self.review_reason or '',
@@ -474,6 +765,9 @@ class DeliveryEvidenceControl(models.Model):
             } for l in self.line_ids],
             'evidences': [{
                 'id': e.id,
+                'thumbnail_url': e.id in thumbnail_ids and (
+                    f'/web/image/delivery.evidence.document/{e.id}/thumbnail'
+                    f'?unique={e.file_sha256 or ""}') or '',
                 'type': e.evidence_type,
                 'type_label': dict(e._fields['evidence_type'].selection)[e.evidence_type],
                 'name': e.name,
@@ -482,8 +776,8 @@ class DeliveryEvidenceControl(models.Model):
                        f'&id={e.id}&download=true&filename={e.file_name or e.name}',
                 'doc_date': e.doc_date and e.doc_date.strftime('%d/%m/%Y') or '',
                 'uploaded_by': e.create_uid.name,
-                'uploaded_at': fields.Datetime.context_timestamp(
-                    e, e.create_date).strftime('%d/%m/%Y %H:%M'),
+                'uploaded_at': pytz.utc.localize(
+                    e.create_date).astimezone(tz).strftime('%d/%m/%Y %H:%M'),
                 'state': e.state,
                 'validated_by': e.validated_by_id.name or '',
                 'notes': e.notes or '',
@@ -491,18 +785,73 @@ class DeliveryEvidenceControl(models.Model):
         })
         return data
 
-    def js_add_evidence(self, vals):
+    def _evidence_vals(self, vals):
         self.ensure_one()
-        self.env['delivery.evidence.document'].create({
+        return {
             'control_id': self.id,
             'evidence_type': vals.get('evidence_type') or 'remision_firmada',
             'name': vals.get('name') or vals.get('file_name') or _('Evidencia'),
-            'file': vals['file'],
             'file_name': vals.get('file_name'),
             'doc_date': vals.get('doc_date') or False,
             'notes': vals.get('notes') or False,
-        })
-        return self.js_detail()
+        }
+
+    def js_add_evidence(self, vals):
+        """Alta de evidencia en base64 por JSON-RPC (la app usa la ruta
+        /restricciones_entregas/upload_evidence; esta queda por compatibilidad).
+
+        Si el archivo ya estaba cargado en el control no se duplica: el
+        detalle regresa con el aviso en 'duplicates'.
+        """
+        self.ensure_one()
+        _doc, duplicate = self._add_evidence_raw(base64.b64decode(vals['file']), vals)
+        data = self.js_detail()
+        data['duplicates'] = duplicate and [self._js_duplicate(duplicate, vals)] or []
+        return data
+
+    def _add_evidence_raw(self, raw, vals):
+        """Alta de evidencia con el contenido ya en bytes (base64 por JSON-RPC)."""
+        self.ensure_one()
+        return self._add_evidence_stored(
+            {'raw': raw}, hashlib.sha256(raw).hexdigest(), vals)
+
+    def _add_evidence_stored(self, stored, sha256, vals):
+        """Alta de evidencia con el contenido ya almacenado por
+        ir.attachment._stream_to_store (subida multipart) y su huella.
+
+        Regresa (documento, duplicado): si el control ya tiene una evidencia
+        con el mismo contenido no se crea otra y se regresa la existente.
+        """
+        self.ensure_one()
+        self._lock_evidence()
+        Document = self.env['delivery.evidence.document']
+        existing = Document._find_duplicate(self.id, sha256)
+        if existing:
+            return existing, existing
+        doc = Document.create(self._evidence_vals(vals))
+        doc._attach_file(stored, sha256)
+        return doc, Document
+
+    def _lock_evidence(self):
+        """Serializa las altas de evidencia de estos controles.
+
+        La app sube varios archivos en paralelo; sin esto, dos copias de la
+        misma foto pasan _find_duplicate en transacciones distintas. Se
+        toca el renglón (no basta FOR UPDATE): con REPEATABLE READ la
+        segunda transacción falla por serialización, Odoo reintenta la
+        petición y entonces ya ve la evidencia de la primera.
+        """
+        if self.ids:
+            self.env.cr.execute(
+                'UPDATE delivery_evidence_control SET write_date = write_date WHERE id IN %s',
+                [tuple(self.ids)])
+
+    def _js_duplicate(self, existing, vals):
+        return {
+            'file_name': vals.get('file_name') or vals.get('name') or '',
+            'document_id': existing.id,
+            'document_name': existing.name,
+        }
 
     def js_action(self, action):
         """Ejecuta una acción del flujo y regresa el detalle actualizado."""
@@ -546,6 +895,31 @@ class DeliveryEvidenceControl(models.Model):
         doc.action_validate()
         return self.js_detail()
 
+    @api.model
+    def js_validate_documents(self, document_ids):
+        """Valida varias evidencias de una vez.
+
+        Regresa solo lo que cambió: el estado de cada evidencia validada y
+        la etapa documental de sus controles, para que la app actualice el
+        panel y la lista sin volver a pedir el detalle completo.
+        """
+        docs = self.env['delivery.evidence.document'].browse(document_ids).exists()
+        drafts = docs.filtered(lambda d: d.state == 'draft')
+        drafts.action_validate()
+        return {
+            'documents': [{
+                'id': doc.id,
+                'state': doc.state,
+                'validated_by': doc.validated_by_id.name or '',
+            } for doc in drafts],
+            'controls': [{
+                'id': control.id,
+                'doc_state': control.doc_state,
+                'evidence_received_date': control.evidence_received_date and
+                    control.evidence_received_date.strftime('%d/%m/%Y') or '',
+            } for control in drafts.control_id],
+        }
+
     @api.model
     def js_bulk_action(self, control_ids, action):
         """Aplica una acción a varios controles; reporta éxito/fallo por folio."""
@@ -561,86 +935,55 @@ class DeliveryEvidenceControl(models.Model):
 
     @api.model
     def js_sync_recent(self, days=60):
-        if not self.env.user.has_group('restricciones_entregas.group_delivery_evidence_manager'):
+        """Encola la sincronización de los últimos días y regresa su avance;
+        la app consulta js_sync_status hasta que termina."""
+        if not self.env.user._delivery_permissions()['evidence_manager']:
             raise UserError(_('Solo el responsable puede sincronizar ventas.'))
-        date_from = fields.Datetime.now() - timedelta(days=days)
-        orders = self.env['sale.order'].search([
-            ('state', 'in', ['sale', 'done']),
-            ('date_order', '>=', date_from),
-        ])
-        stats = self._sync_from_orders(orders)
-        stats['total'] = len(orders)
-        return stats
+        job = self.env['delivery.evidence.sync.job']._enqueue({
+            'name': _('Sincronización de los últimos %s días') % days,
+            'date_from': fields.Datetime.now() - timedelta(days=days),
+        })
+        return job._js_status()
 
     @api.model
-    def js_match_excel(self, file_b64, filename):
-        """Empata un Excel contra los controles por folio de venta, folio de
-        producción, OC del cliente o factura Compact: sirve para palomear en
-        lote lo que venga listado en cualquier layout de Excel."""
-        content = base64.b64decode(file_b64)
-        fname = (filename or '').lower()
-        tokens = set()
-        if fname.endswith('.xlsx'):
-            import openpyxl
-            wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
-            for sheet in wb.worksheets:
-                for row in sheet.iter_rows(values_only=True):
-                    for value in row:
-                        if isinstance(value, str) and 2 < len(value.strip()) <= 64:
-                            tokens.add(value.strip().lower())
-        elif fname.endswith('.xls'):
-            try:
-                import xlrd
-            except ImportError:
-                raise UserError(_('El servidor no puede leer .xls; guarda el archivo como .xlsx.'))
-            wb = xlrd.open_workbook(file_contents=content)
-            for sheet in wb.sheets():
-                for r in range(sheet.nrows):
-                    for c in range(sheet.ncols):
-                        value = sheet.cell_value(r, c)
-                        if isinstance(value, str) and 2 < len(value.strip()) <= 64:
-                            tokens.add(value.strip().lower())
-        else:
-            raise UserError(_('Sube un archivo .xlsx o .xls.'))
+    def js_sync_status(self, job_id):
+        return self.env['delivery.evidence.sync.job'].browse(job_id)._js_status()
 
-        index = {}
-        for control in self.search([]):
-            identifiers = [control.name or '', control.client_order_ref or '',
-                           control.compact_invoice_folio or '']
-            identifiers += (control.production_folios or '').split(', ')
-            for identifier in identifiers:
-                if identifier:
-                    index.setdefault(identifier.strip().lower(), control)
-
-        matched = self.browse()
-        unmatched = []
-        for token in sorted(tokens):
-            control = index.get(token)
-            if control:
-                matched |= control
-            else:
-                unmatched.append(token)
+    @api.model
+    def _diagnose_unmatched_tokens(self, tokens):
+        """Diagnóstico de tokens con forma de folio que no empataron.
+
+        Si la orden de venta confirmada existe sin control, se crea al
+        vuelo; si no está confirmada, se explica por qué no puede
+        palomearse. Todas las órdenes se resuelven con una sola búsqueda
+        sin distinguir mayúsculas y las confirmadas se sincronizan en un
+        solo lote. Regresa (controles creados, diagnósticos).
+        """
+        folio_tokens = [t for t in tokens[:300] if FOLIO_PATTERN.match(t)]
+        if not folio_tokens:
+            return self.browse(), []
+        orders_by_token = {}
+        for order in self.env['sale.order'].search(
+                expression.OR([[('name', '=ilike', t)] for t in folio_tokens])):
+            orders_by_token.setdefault(order.name.lower(), order)
+
+        confirmed = self.env['sale.order'].browse(dict.fromkeys(
+            o.id for o in orders_by_token.values() if o.state in ('sale', 'done')))
+        created = self.browse()
+        if confirmed:
+            self._sync_from_orders(confirmed)
+            created = self.search([('sale_order_id', 'in', confirmed.ids)])
 
-        # Diagnóstico de tokens con forma de folio: si la orden de venta
-        # confirmada existe sin control, se crea al vuelo; si no está
-        # confirmada, se explica por qué no puede palomearse.
-        folio_pattern = re.compile(r'^[a-z]{0,6}[\-/]?\d{3,}([\-/]\d+)?$')
         diagnostics = []
-        SaleOrder = self.env['sale.order']
-        for token in unmatched[:300]:
-            if not folio_pattern.match(token):
-                continue
-            order = SaleOrder.search([('name', '=ilike', token)], limit=1)
+        for token in folio_tokens:
+            order = orders_by_token.get(token)
             if not order:
                 diagnostics.append({
                     'token': token.upper(), 'status': 'unknown',
                     'detail': _('No corresponde a ninguna orden de venta, folio de '
                                 'producción, OC de cliente ni factura Compact.'),
                 })
-                continue
-            if order.state in ('sale', 'done'):
-                self._sync_from_orders(order)
-                matched |= self.search([('sale_order_id', '=', order.id)])
+            elif order.state in ('sale', 'done'):
                 diagnostics.append({
                     'token': order.name, 'status': 'created',
                     'detail': _('Orden confirmada sin control previo: se creó y ya '
@@ -657,12 +1000,111 @@ class DeliveryEvidenceControl(models.Model):
                     'detail': _('La orden de venta existe pero aún no está confirmada; '
                                 'no hay expediente que palomear.'),
                 })
+        return created, diagnostics
+
+    @api.model
+    def js_match_excel(self, file_b64, filename):
+        """Empata un Excel contra los controles por folio de venta, folio de
+        producción, OC del cliente o factura Compact: sirve para palomear en
+        lote lo que venga listado en cualquier layout de Excel.
+
+        Compatibilidad con la carga en base64; la app sube el archivo en
+        binario a /restricciones_entregas/match_excel (ver _match_excel_stream).
+        """
+        return self._match_excel_stream(io.BytesIO(base64.b64decode(file_b64)), filename)
+
+    @api.model
+    def _iter_excel_cells(self, stream, filename):
+        """Valores de celda del archivo, hoja por hoja y renglón por renglón."""
+        fname = (filename or '').lower()
+        if fname.endswith('.xlsx'):
+            import openpyxl
+            wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+            try:
+                for sheet in wb.worksheets:
+                    for row in sheet.iter_rows(values_only=True):
+                        yield from row
+            finally:
+                wb.close()
+        elif fname.endswith('.xls'):
+            try:
+                import xlrd
+            except ImportError:
+                raise UserError(_('El servidor no puede leer .xls; guarda el archivo como .xlsx.'))
+            # El formato .xls no se puede leer por partes; al menos las hojas
+            # se cargan y liberan una a la vez.
+            wb = xlrd.open_workbook(file_contents=stream.read(), on_demand=True)
+            try:
+                for index in range(wb.nsheets):
+                    sheet = wb.sheet_by_index(index)
+                    for r in range(sheet.nrows):
+                        yield from sheet.row_values(r)
+                    wb.unload_sheet(index)
+            finally:
+                wb.release_resources()
+        elif fname.endswith('.csv'):
+            sample = stream.read(4096).decode('utf-8-sig', errors='replace')
+            stream.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+            except csv.Error:
+                dialect = csv.excel
+            reader = codecs.getreader('utf-8-sig')(stream, errors='replace')
+            for row in csv.reader(reader, dialect):
+                yield from row
+        else:
+            raise UserError(_('Sube un archivo .xlsx, .xls o .csv.'))
+
+    @api.model
+    def _iter_excel_tokens(self, stream, filename):
+        """Candidatos a identificador, normalizados y sin repetir.
+
+        Se descartan desde la lectura las celdas que no son texto o que están
+        fuera de los límites de longitud de un identificador.
+        """
+        seen = set()
+        for value in self._iter_excel_cells(stream, filename):
+            if not isinstance(value, str):
+                continue
+            token = value.strip()
+            if not 2 < len(token) <= 64:
+                continue
+            token = token.lower()
+            if token not in seen:
+                seen.add(token)
+                yield token
+
+    @api.model
+    def _match_excel_stream(self, stream, filename):
+        """Empata el archivo conforme se lee, por bloques de tokens.
+
+        La memoria queda acotada por los identificadores distintos del
+        archivo, no por su tamaño: cada bloque se resuelve contra el índice
+        de identificadores y solo se guardan los controles encontrados y los
+        tokens con forma de folio para el diagnóstico.
+        """
+        matched_ids = {}
+        unmatched_folios = []
+        scanned = 0
+        for chunk in split_every(MATCH_CHUNK_SIZE, self._iter_excel_tokens(stream, filename)):
+            scanned += len(chunk)
+            index = self._match_identifiers(chunk)
+            for token in chunk:
+                control = index.get(token)
+                if control:
+                    matched_ids[control.id] = True
+                elif len(unmatched_folios) < 300 and FOLIO_PATTERN.match(token):
+                    unmatched_folios.append(token)
+        matched = self.browse(matched_ids)
+
+        created, diagnostics = self._diagnose_unmatched_tokens(sorted(unmatched_folios))
+        matched |= created
 
         return {
-            'matched': [c._js_row() for c in matched.sorted(
-                key=lambda c: (c.order_date or fields.Date.today(), c.id))],
+            'matched': matched.sorted(
+                key=lambda c: (c.order_date or fields.Date.today(), c.id))._js_rows(),
             'diagnostics': diagnostics[:40],
-            'cells_scanned': len(tokens),
+            'cells_scanned': scanned,
         }
 
 
@@ -684,6 +1126,22 @@ class DeliveryEvidenceControlLine(models.Model):
     qty_pending = fields.Float('Pendiente', digits='Product Unit of Measure', readonly=True)
 
 
+class DeliveryEvidenceIdentifier(models.Model):
+    _name = 'delivery.evidence.identifier'
+    _description = 'Identificador de control para empatar Excel'
+    _order = 'id'
+
+    identifier = fields.Char('Identificador', required=True, index=True)
+    control_id = fields.Many2one(
+        'delivery.evidence.control', required=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one(related='control_id.company_id', store=True)
+
+    _sql_constraints = [
+        ('identifier_control_uniq', 'unique(identifier, control_id)',
+         'El identificador ya está registrado para ese control.'),
+    ]
+
+
 class DeliveryEvidenceDocument(models.Model):
     _name = 'delivery.evidence.document'
     _description = 'Evidencia de entrega'
@@ -703,6 +1161,14 @@ class DeliveryEvidenceDocument(models.Model):
     name = fields.Char('Nombre', required=True)
     file = fields.Binary('Archivo', attachment=True, required=True)
     file_name = fields.Char('Nombre del archivo')
+    file_sha256 = fields.Char(
+        'Huella SHA-256', index=True, readonly=True, copy=False,
+        help='Huella del contenido: el mismo archivo no se carga dos veces en un control.')
+    thumbnail = fields.Image(
+        'Miniatura', max_width=THUMBNAIL_PX, max_height=THUMBNAIL_PX, readonly=True)
+    original_file = fields.Binary(
+        'Archivo original', attachment=True, readonly=True,
+        help='Foto tal como se subió, si el parámetro keep_original está activo.')
     doc_date = fields.Date('Fecha del documento')
     notes = fields.Char('Observaciones')
     state = fields.Selection([
@@ -714,7 +1180,26 @@ class DeliveryEvidenceDocument(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
+        # El archivo se guarda aparte con _attach_file: el alta desde
+        # formularios (base64) y la subida multipart siguen el mismo camino.
+        files = []
+        seen = set()
+        self.env['delivery.evidence.control'].browse(
+            {vals['control_id'] for vals in vals_list if vals.get('control_id')})._lock_evidence()
+        for vals in vals_list:
+            file = vals.pop('file', False)
+            raw = file and base64.b64decode(file)
+            sha256 = raw and hashlib.sha256(raw).hexdigest()
+            files.append((raw, sha256))
+            if raw:
+                key = (vals.get('control_id'), sha256)
+                if key in seen or self._find_duplicate(*key):
+                    raise UserError(_('Ese archivo ya está cargado en este control.'))
+                seen.add(key)
         docs = super().create(vals_list)
+        for doc, (raw, sha256) in zip(docs, files):
+            if raw:
+                doc._attach_file({'raw': raw}, sha256)
         for doc in docs:
             doc.control_id.message_post(body=_(
                 'Evidencia cargada: %(type)s — %(name)s'
@@ -723,24 +1208,142 @@ class DeliveryEvidenceDocument(models.Model):
         docs.control_id._update_evidence_stage()
         return docs
 
+    def write(self, vals):
+        # Reemplazar el archivo (lista editable del control) vuelve a pasar
+        # por _attach_file: el adjunto anterior, la miniatura y el original
+        # se borran y la huella se recalcula, igual que en el alta.
+        if 'file' not in vals:
+            return super().write(vals)
+        vals = dict(vals)
+        file = vals.pop('file')
+        raw = file and base64.b64decode(file)
+        sha256 = raw and hashlib.sha256(raw).hexdigest()
+        if raw:
+            self.control_id._lock_evidence()
+            for doc in self:
+                if doc._find_duplicate(doc.control_id.id, sha256, exclude=doc):
+                    raise UserError(_('Ese archivo ya está cargado en este control.'))
+        res = super().write(dict(
+            vals, file=False, file_sha256=False, thumbnail=False, original_file=False))
+        if raw:
+            for doc in self:
+                doc._attach_file({'raw': raw}, sha256)
+        return res
+
+    @api.model
+    def _find_duplicate(self, control_id, sha256, exclude=None):
+        """Evidencia del control con exactamente el mismo contenido, si la hay."""
+        if not control_id or not sha256:
+            return self.browse()
+        domain = [('control_id', '=', control_id), ('file_sha256', '=', sha256)]
+        if exclude:
+            domain.append(('id', 'not in', exclude.ids))
+        return self.search(domain, limit=1)
+
+    @api.model
+    def _image_params(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        return {key: ICP.get_param(IMAGE_PARAM_PREFIX + key, default)
+                for key, default in IMAGE_DEFAULTS.items()}
+
+    def _process_image(self, raw, params):
+        """Endereza (EXIF), reduce y recomprime la foto de esta evidencia.
+
+        Regresa los bytes normalizados, o None si el archivo no es una foto
+        procesable (PDF, HEIC, imagen dañada o demasiado grande) o el
+        pipeline está apagado; en ese caso el archivo se guarda tal cual.
+        """
+        self.ensure_one()
+        mimetype = guess_mimetype(raw)
+        if not str2bool(params['process']) or mimetype not in IMAGE_MIMETYPES:
+            return None
+        max_px = int(params['max_px'])
+        # La calidad solo aplica a JPEG: en PNG image_process la usa para
+        # reducir a la paleta WEB de 256 colores.
+        quality = int(params['quality']) if mimetype == 'image/jpeg' else 0
+        try:
+            return image_process(raw, size=(max_px, max_px), quality=quality)
+        except (UserError, ValueError, OSError, Image.DecompressionBombError):
+            _logger.warning('Evidencia %s: no se pudo normalizar la imagen.', self.id)
+            return None
+
+    def _stored_image_raw(self, stored, params):
+        """Bytes de una foto candidata a normalizarse, o None.
+
+        Solo se lee de vuelta del filestore lo que puede ser una foto de
+        tamaño razonable; PDFs y archivos grandes se adjuntan tal cual.
+        """
+        if not str2bool(params['process']):
+            return None
+        if 'raw' in stored:
+            return stored['raw']
+        if stored['file_size'] > IMAGE_MAX_BYTES:
+            return None
+        with open(self.env['ir.attachment']._full_path(stored['store_fname']), 'rb') as stream:
+            if guess_mimetype(stream.read(1024)) not in IMAGE_MIMETYPES:
+                return None
+            stream.seek(0)
+            return stream.read()
+
+    def _attach_file(self, stored, sha256):
+        """Adjunta como campo file el contenido de stored, sin pasar por base64.
+
+        stored viene de ir.attachment._stream_to_store o es {'raw': bytes}.
+        Las fotos se normalizan y se guarda su miniatura; la huella es la
+        del archivo subido, para reconocerlo si se vuelve a cargar. El
+        filestore de Odoo ya guarda por contenido: el mismo archivo cargado
+        en varios controles ocupa un solo blob en disco.
+        """
+        self.ensure_one()
+        Attachment = self.env['ir.attachment'].sudo()
+        params = self._image_params()
+        raw = self._stored_image_raw(stored, params)
+        image = raw and self._process_image(raw, params)
+        attachment_vals = {
+            'name': self.file_name or self.name,
+            'res_model': self._name,
+            'res_id': self.id,
+            'type': 'binary',
+        }
+        vals = {'file_sha256': sha256}
+        if image:
+            vals['thumbnail'] = base64.b64encode(image)
+            Attachment.create(dict(attachment_vals, res_field='file', raw=image))
+            if str2bool(params['keep_original']):
+                Attachment._create_stored(dict(attachment_vals, res_field='original_file'), stored)
+        else:
+            Attachment._create_stored(dict(attachment_vals, res_field='file'), stored)
+        self.write(vals)
+        self.invalidate_recordset(['file', 'original_file'])
+
     def action_validate(self):
-        manager = self.env.user.has_group(
-            'restricciones_entregas.group_delivery_evidence_manager')
+        """Valida las evidencias en borrador con una sola escritura, un
+        mensaje por control y un solo recálculo de etapa."""
+        manager = self.env.user._delivery_permissions()['evidence_manager']
         if not manager:
             raise UserError(_('Solo el responsable puede validar evidencias.'))
-        for doc in self.filtered(lambda d: d.state == 'draft'):
-            doc.write({
-                'state': 'validated',
-                'validated_by_id': self.env.user.id,
-                'validated_date': fields.Datetime.now(),
-            })
-            doc.control_id.message_post(body=_('Evidencia validada: %s') % doc.name)
-        self.control_id._update_evidence_stage()
+        drafts = self.filtered(lambda d: d.state == 'draft')
+        if not drafts:
+            return True
+        drafts.write({
+            'state': 'validated',
+            'validated_by_id': self.env.user.id,
+            'validated_date': fields.Datetime.now(),
+        })
+        names_by_control = defaultdict(list)
+        for doc in drafts:
+            names_by_control[doc.control_id].append(doc.name)
+        for control, names in names_by_control.items():
+            if len(names) == 1:
+                control.message_post(body=_('Evidencia validada: %s') % names[0])
+            else:
+                control.message_post(body=_('Evidencias validadas (%(count)s): %(names)s') % {
+                    'count': len(names), 'names': ', '.join(names)})
+        drafts.control_id._update_evidence_stage()
         return True
 
     def unlink(self):
-        manager = self.env.user.has_group(
-            'restricciones_entregas.group_delivery_evidence_manager')
+        manager = self.env.user._delivery_permissions()['evidence_manager']
         controls = self.control_id
         for doc in self:
             if doc.state == 'validated' and not manager:
@@ -768,3 +1371,39 @@ class SaleOrderEvidenceHook(models.Model):
                 'Control de Entregas y Evidencias: no se pudo crear el control '
                 'automático al confirmar; la venta se confirmó normalmente.')
         return res
+
+    def write(self, vals):
+        # Folio, OC y folios por línea alimentan el índice de identificadores.
+        res = super().write(vals)
+        if {'name', 'client_order_ref', 'order_line'} & vals.keys():
+            self._evidence_controls()._sync_identifiers()
+        return res
+
+    def _assign_delivery_folio_numbers(self):
+        # Las escrituras por consecutivo no sincronizan línea por línea: se
+        # sincroniza una sola vez al terminar la asignación.
+        res = super(SaleOrderEvidenceHook, self.with_context(
+            skip_identifier_sync=True))._assign_delivery_folio_numbers()
+        self._evidence_controls()._sync_identifiers()
+        return res
+
+    def _evidence_controls(self):
+        return self.env['delivery.evidence.control'].sudo().with_context(
+            active_test=False).search([('sale_order_id', 'in', self.ids)])
+
+
+class SaleOrderLineEvidenceHook(models.Model):
+    _inherit = 'sale.order.line'
+
+    def write(self, vals):
+        # El folio por línea forma parte de production_folios del control.
+        res = super().write(vals)
+        if 'delivery_folio_number' in vals and not self.env.context.get('skip_identifier_sync'):
+            self.order_id._evidence_controls()._sync_identifiers()
+        return res
+
+    def unlink(self):
+        orders = self.order_id
+        res = super().unlink()
+        orders.exists()._evidence_controls()._sync_identifiers()
+        return res
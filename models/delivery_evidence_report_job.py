@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+"""Relación en Excel para Administración, generada en segundo plano.
+
+Usa xlsxwriter, dependencia estándar de Odoo. Las columnas reflejan el
+control alterno: la venta y las remisiones son de Odoo; la factura es la
+capturada de Compact (CONTPAQi).
+
+El asistente solo encola los filtros; un ir.cron arma los archivos (el
+Excel y, si se pide, el ZIP con las evidencias) en orden y los adjunta
+al trabajo. Si varios coordinadores piden la misma
+relación en pocos minutos (cierre de mes), comparten un solo armado.
+"""
+import hashlib
+import logging
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+
+import pytz
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+from .delivery_evidence import DELIVERY_STATES, DOC_STATES
+
+_logger = logging.getLogger(__name__)
+
+# Controles leídos por bloque al escribir la relación.
+REPORT_CHUNK_SIZE = 500
+
+# Columnas leídas de cada control para la relación.
+REPORT_FIELDS = [
+    'order_date', 'name', 'partner_code', 'partner_id', 'client_order_ref',
+    'production_folios', 'currency_id', 'amount_total', 'compact_invoice_folio',
+    'compact_invoice_date', 'compact_invoice_amount', 'qty_ordered',
+    'qty_delivered', 'qty_pending', 'delivered_pct', 'delivery_state',
+    'doc_state', 'evidence_received_date', 'sent_date', 'notes',
+]
+
+
+# Una relación con los mismos filtros pedida dentro de esta ventana
+# reutiliza el trabajo en curso o recién terminado.
+REPORT_DEDUP_MINUTES = 10
+
+# Los trabajos (y sus archivos) se borran pasado este plazo.
+REPORT_JOB_RETENTION_DAYS = 30
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Caracteres que no pueden ir en el nombre de una carpeta o archivo del ZIP.
+ARCNAME_UNSAFE = re.compile(r'[\\/:*?"<>|]+')
+
+REPORT_JOB_STATES = [
+    ('queued', 'En cola'),
+    ('running', 'En proceso'),
+    ('done', 'Terminado'),
+    ('failed', 'Con error'),
+]
+
+
+class DeliveryEvidenceReportMixin(models.AbstractModel):
+    """Filtros de la relación y escritura del Excel, compartidos por el
+    asistente y el trabajo en segundo plano."""
+    _name = 'delivery.evidence.report.mixin'
+    _description = 'Filtros de la relación para Administración'
+
+    date_from = fields.Date('Fecha inicial')
+    date_to = fields.Date('Fecha final')
+    company_id = fields.Many2one(
+        'res.company', 'Compañía', default=lambda self: self.env.company)
+    partner_ids = fields.Many2many('res.partner', string='Clientes')
+    delivery_state = fields.Selection(DELIVERY_STATES, 'Estado de entrega')
+    doc_state = fields.Selection(DOC_STATES, 'Estado documental')
+    only_ready = fields.Boolean('Solo expedientes completos')
+    only_not_sent = fields.Boolean('Solo no enviados', default=True)
+    control_ids = fields.Many2many(
+        'delivery.evidence.control', string='Controles seleccionados')
+    include_evidence_package = fields.Boolean(
+        'Incluir ZIP de evidencias',
+        help='Además del Excel, arma un ZIP con la relación y las evidencias '
+             'validadas de cada control.')
+
+    def _report_filter_vals(self):
+        self.ensure_one()
+        return {
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'company_id': self.company_id.id,
+            'partner_ids': [(6, 0, self.partner_ids.ids)],
+            'delivery_state': self.delivery_state,
+            'doc_state': self.doc_state,
+            'only_ready': self.only_ready,
+            'only_not_sent': self.only_not_sent,
+            'control_ids': [(6, 0, self.control_ids.ids)],
+            'include_evidence_package': self.include_evidence_package,
+        }
+
+    def _find_controls(self):
+        self.ensure_one()
+        if self.control_ids:
+            return self.control_ids
+        domain = []
+        if self.company_id:
+            domain.append(('company_id', '=', self.company_id.id))
+        if self.date_from:
+            domain.append(('order_date', '>=', self.date_from))
+        if self.date_to:
+            domain.append(('order_date', '<=', self.date_to))
+        if self.partner_ids:
+            domain.append(('partner_id', 'in', self.partner_ids.ids))
+        if self.delivery_state:
+            domain.append(('delivery_state', '=', self.delivery_state))
+        if self.doc_state:
+            domain.append(('doc_state', '=', self.doc_state))
+        if self.only_ready:
+            domain.append(('doc_state', 'in', ['ready', 'sent']))
+        if self.only_not_sent:
+            domain.append(('doc_state', '!=', 'sent'))
+        return self.env['delivery.evidence.control'].search(
+            domain, order='order_date, name')
+
+    def _write_relation_xlsx(self, controls, fileobj):
+        """Escribe la relación en fileobj con memoria constante.
+
+        xlsxwriter en modo constant_memory vuelca cada renglón a disco al
+        pasar al siguiente, y los controles se leen por bloques liberando la
+        caché del ORM, así que la memoria no crece con el tamaño del periodo.
+        Cada bloque es una lectura columnar con los nombres de cliente y
+        moneda resueltos juntos; los totales salen de una agregación en SQL.
+        """
+        self.ensure_one()
+        import xlsxwriter
+
+        delivery_labels = dict(DELIVERY_STATES)
+        doc_labels = dict(DOC_STATES)
+
+        book = xlsxwriter.Workbook(fileobj, {'constant_memory': True})
+        sheet = book.add_worksheet('Relación')
+        title_fmt = book.add_format({'bold': True, 'font_size': 14, 'font_color': '#14425C'})
+        sub_fmt = book.add_format({'font_color': '#6A7D8A'})
+        head_fmt = book.add_format({
+            'bold': True, 'bg_color': '#14425C', 'font_color': '#FFFFFF',
+            'border': 1, 'text_wrap': True, 'valign': 'vcenter'})
+        date_fmt = book.add_format({'num_format': 'dd/mm/yyyy', 'border': 1})
+        money_fmt = book.add_format({'num_format': '#,##0.00', 'border': 1})
+        qty_fmt = book.add_format({'num_format': '#,##0.00', 'border': 1})
+        pct_fmt = book.add_format({'num_format': '0.0"%"', 'border': 1})
+        cell_fmt = book.add_format({'border': 1})
+        total_fmt = book.add_format({
+            'bold': True, 'num_format': '#,##0.00', 'top': 2, 'bg_color': '#F2F6F9'})
+        total_lbl_fmt = book.add_format({'bold': True, 'top': 2, 'bg_color': '#F2F6F9'})
+
+        company = self.company_id or self.env.company
+        period = _('Periodo: %(f)s a %(t)s') % {
+            'f': self.date_from and self.date_from.strftime('%d/%m/%Y') or '—',
+            't': self.date_to and self.date_to.strftime('%d/%m/%Y') or '—',
+        }
+        sheet.write(0, 0, _('Relación de Entregas y Evidencias — %s') % company.name, title_fmt)
+        sheet.write(1, 0, period, sub_fmt)
+        sheet.write(2, 0, _('Generado el %(d)s por %(u)s') % {
+            'd': fields.Datetime.context_timestamp(
+                self, fields.Datetime.now()).strftime('%d/%m/%Y %H:%M'),
+            'u': self.env.user.name,
+        }, sub_fmt)
+
+        headers = [
+            (_('Fecha pedido'), 11), (_('Orden de venta'), 13), (_('Código cliente'), 13),
+            (_('Razón social'), 32), (_('OC del cliente'), 16),
+            (_('Folios de producción'), 24), (_('Moneda'), 8), (_('Total venta'), 14),
+            (_('Factura Compact'), 15), (_('Fecha factura'), 12), (_('Importe factura'), 14),
+            (_('Cant. pedida'), 12), (_('Cant. entregada'), 12), (_('Cant. pendiente'), 12),
+            (_('% entregado'), 10), (_('Estado entrega'), 14), (_('Estado evidencia'), 18),
+            (_('Fecha evidencia'), 12), (_('Envío a Administración'), 14), (_('Observaciones'), 30),
+        ]
+        header_row = 4
+        for col, (label, width) in enumerate(headers):
+            sheet.write(header_row, col, label, head_fmt)
+            sheet.set_column(col, col, width)
+        sheet.autofilter(header_row, 0, header_row + len(controls), len(headers) - 1)
+        sheet.freeze_panes(header_row + 1, 0)
+
+        row = header_row
+        tz = self.env['delivery.evidence.control']._get_user_tz()
+        for batch_ids in split_every(REPORT_CHUNK_SIZE, controls.ids):
+            records = controls.browse(batch_ids).read(REPORT_FIELDS, load=None)
+            partner_names = {p['id']: p['name'] for p in self.env['res.partner'].browse(
+                {r['partner_id'] for r in records if r['partner_id']}).read(['name'])}
+            currency_names = {c['id']: c['name'] for c in self.env['res.currency'].browse(
+                {r['currency_id'] for r in records if r['currency_id']}).read(['name'])}
+            for r in records:
+                row += 1
+                sheet.write(row, 0, r['order_date'] or '', date_fmt)
+                sheet.write(row, 1, r['name'] or '', cell_fmt)
+                sheet.write(row, 2, r['partner_code'] or '', cell_fmt)
+                sheet.write(row, 3, partner_names.get(r['partner_id']) or '', cell_fmt)
+                sheet.write(row, 4, r['client_order_ref'] or '', cell_fmt)
+                sheet.write(row, 5, r['production_folios'] or '', cell_fmt)
+                sheet.write(row, 6, currency_names.get(r['currency_id']) or '', cell_fmt)
+                sheet.write(row, 7, r['amount_total'], money_fmt)
+                sheet.write(row, 8, r['compact_invoice_folio'] or '', cell_fmt)
+                sheet.write(row, 9, r['compact_invoice_date'] or '', date_fmt)
+                sheet.write(row, 10, r['compact_invoice_amount'] or 0.0, money_fmt)
+                sheet.write(row, 11, r['qty_ordered'], qty_fmt)
+                sheet.write(row, 12, r['qty_delivered'], qty_fmt)
+                sheet.write(row, 13, r['qty_pending'], qty_fmt)
+                sheet.write(row, 14, r['delivered_pct'], pct_fmt)
+                sheet.write(row, 15, delivery_labels.get(r['delivery_state'], ''), cell_fmt)
+                sheet.write(row, 16, doc_labels.get(r['doc_state'], ''), cell_fmt)
+                sheet.write(row, 17, r['evidence_received_date'] or '', date_fmt)
+                sheet.write(row, 18, r['sent_date'] and pytz.utc.localize(
+                    r['sent_date']).astimezone(tz).strftime('%d/%m/%Y') or '', cell_fmt)
+                sheet.write(row, 19, r['notes'] or '', cell_fmt)
+            # Libera la caché del bloque (controles, ventas, clientes).
+            self.env.invalidate_all()
+
+        totals = self._relation_totals(controls)
+        row += 1
+        sheet.write(row, 3, _('TOTALES (%s registros)') % len(controls), total_lbl_fmt)
+        for col in (0, 1, 2, 4, 5, 6, 8, 9, 14, 15, 16, 17, 18, 19):
+            sheet.write(row, col, '', total_lbl_fmt)
+        sheet.write(row, 7, totals['venta'], total_fmt)
+        sheet.write(row, 10, totals['compact'], total_fmt)
+        sheet.write(row, 11, totals['ord'], total_fmt)
+        sheet.write(row, 12, totals['dlv'], total_fmt)
+        sheet.write(row, 13, totals['pen'], total_fmt)
+
+        book.close()
+
+    def _relation_totals(self, controls):
+        """Totales de la relación en una sola agregación en SQL.
+
+        El total de venta no se guarda en el control (es related de la
+        venta), así que se suma desde sale_order.
+        """
+        controls.flush_recordset([
+            'sale_order_id', 'compact_invoice_amount',
+            'qty_ordered', 'qty_delivered', 'qty_pending',
+        ])
+        self.env['sale.order'].flush_model(['amount_total'])
+        self.env.cr.execute(
+            """
+            SELECT COALESCE(SUM(so.amount_total), 0),
+                   COALESCE(SUM(c.compact_invoice_amount), 0),
+                   COALESCE(SUM(c.qty_ordered), 0),
+                   COALESCE(SUM(c.qty_delivered), 0),
+                   COALESCE(SUM(c.qty_pending), 0)
+            FROM delivery_evidence_control c
+            JOIN sale_order so ON so.id = c.sale_order_id
+            WHERE c.id = ANY(%s)
+            """,
+            [controls.ids],
+        )
+        venta, compact, ordered, delivered, pending = map(float, self.env.cr.fetchone())
+        return {
+            'venta': venta, 'compact': compact,
+            'ord': ordered, 'dlv': delivered, 'pen': pending,
+        }
+
+
+class DeliveryEvidenceReportJob(models.Model):
+    _name = 'delivery.evidence.report.job'
+    _inherit = 'delivery.evidence.report.mixin'
+    _description = 'Relación para Administración en segundo plano'
+    _order = 'id desc'
+
+    name = fields.Char('Descripción', required=True)
+    state = fields.Selection(
+        REPORT_JOB_STATES, 'Estado', default='queued', required=True, index=True)
+    user_id = fields.Many2one(
+        'res.users', 'Solicitó', default=lambda self: self.env.user, readonly=True)
+    requester_ids = fields.Many2many(
+        'res.users', 'dec_report_job_requester_rel', 'job_id', 'user_id',
+        string='Solicitantes', readonly=True,
+        help='Usuarios que pidieron esta relación; todos reciben el aviso al terminar.')
+    filter_key = fields.Char('Llave de filtros', index=True, readonly=True)
+    control_count = fields.Integer('Controles incluidos', readonly=True)
+    included_control_ids = fields.Many2many(
+        'delivery.evidence.control', 'dec_report_job_included_rel', 'job_id', 'control_id',
+        string='Incluidos en la relación', readonly=True,
+        help='Controles que quedaron en el archivo; son los que se marcan como enviados.')
+    file_name = fields.Char('Archivo', readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', 'Relación', readonly=True)
+    download_url = fields.Char('Descargar relación', compute='_compute_download_url')
+    package_file_name = fields.Char('Archivo ZIP', readonly=True)
+    package_attachment_id = fields.Many2one('ir.attachment', 'Paquete de evidencias', readonly=True)
+    package_url = fields.Char('Descargar ZIP', compute='_compute_download_url')
+    date_start = fields.Datetime('Inicio', readonly=True)
+    date_end = fields.Datetime('Fin', readonly=True)
+    error = fields.Text('Error', readonly=True)
+
+    @api.depends('attachment_id', 'package_attachment_id')
+    def _compute_download_url(self):
+        for job in self:
+            job.download_url = job.attachment_id and (
+                '/web/content/%s?download=true' % job.attachment_id.id) or False
+            job.package_url = job.package_attachment_id and (
+                '/web/content/%s?download=true' % job.package_attachment_id.id) or False
+
+    # ==================================================================
+    # Encolado
+    # ==================================================================
+    @api.model
+    def _filter_key(self, vals):
+        """Huella de los filtros: misma huella, misma relación.
+
+        Incluye las compañías del solicitante: el archivo se arma con sus
+        reglas de acceso, así que solo se comparte entre usuarios que ven
+        exactamente las mismas compañías.
+        """
+        def ids(commands):
+            return sorted(commands[0][2]) if commands else []
+        key = repr((
+            sorted(self.env.user.company_ids.ids),
+            vals.get('company_id') or False,
+            str(vals.get('date_from') or ''),
+            str(vals.get('date_to') or ''),
+            ids(vals.get('partner_ids')),
+            vals.get('delivery_state') or False,
+            vals.get('doc_state') or False,
+            bool(vals.get('only_ready')),
+            bool(vals.get('only_not_sent')),
+            ids(vals.get('control_ids')),
+            bool(vals.get('include_evidence_package')),
+        ))
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    @api.model
+    def _enqueue(self, vals):
+        """Encola la relación o reutiliza una igual pedida hace poco.
+
+        Comparte el trabajo si con los mismos filtros hay uno en cola, en
+        proceso, o terminado dentro de REPORT_DEDUP_MINUTES; el usuario se
+        suma a los solicitantes para recibir el aviso.
+        """
+        key = self._filter_key(vals)
+        since = fields.Datetime.now() - timedelta(minutes=REPORT_DEDUP_MINUTES)
+        job = self.search([
+            ('filter_key', '=', key),
+            '|', ('state', 'in', ['queued', 'running']),
+                 '&', ('state', '=', 'done'), ('date_end', '>=', since),
+        ], limit=1)
+        if job:
+            job.requester_ids = [(4, self.env.user.id)]
+            return job
+        job = self.create(dict(
+            vals, filter_key=key, requester_ids=[(4, self.env.user.id)]))
+        self.env.ref('restricciones_entregas.ir_cron_delivery_evidence_report_jobs')._trigger()
+        return job
+
+    # ==================================================================
+    # Armado
+    # ==================================================================
+    def _build_file(self):
+        """Arma el Excel (y el ZIP si se pidió) con los permisos de quien
+        lo pidió y los adjunta al trabajo.
+
+        El ZIP reutiliza el mismo Excel recién escrito; ambos se copian al
+        filestore por bloques desde sus temporales.
+        """
+        self.ensure_one()
+        # Mismo alcance que la huella: todas las compañías de quien lo pidió.
+        job = self.with_user(self.user_id).with_context(
+            allowed_company_ids=self.user_id.company_ids.ids)
+        controls = job._find_controls()
+        if not controls:
+            raise UserError(_('No hay controles que coincidan con los filtros.'))
+        # El conjunto queda guardado antes de escribir nada: Excel, ZIP y
+        # "marcar como enviados" trabajan sobre los mismos controles.
+        self.write({
+            'control_count': len(controls),
+            'included_control_ids': [(6, 0, controls.ids)],
+        })
+        today = fields.Date.context_today(job).strftime('%Y%m%d')
+        Attachment = job.env['ir.attachment']
+        attachment_vals = {'res_model': self._name, 'res_id': self.id}
+        vals = {
+            'state': 'done',
+            'file_name': 'relacion_entregas_evidencias_%s.xlsx' % today,
+        }
+        with tempfile.TemporaryFile() as relation:
+            job._write_relation_xlsx(controls, relation)
+            relation.seek(0)
+            vals['attachment_id'] = Attachment._create_from_file(relation, dict(
+                attachment_vals, name=vals['file_name'], mimetype=XLSX_MIMETYPE)).id
+            if self.include_evidence_package:
+                vals['package_file_name'] = 'evidencias_entregas_%s.zip' % today
+                with tempfile.TemporaryFile() as package:
+                    job._write_evidence_package(package, relation)
+                    package.seek(0)
+                    vals['package_attachment_id'] = Attachment._create_from_file(package, dict(
+                        attachment_vals, name=vals['package_file_name'],
+                        mimetype='application/zip')).id
+        vals['date_end'] = fields.Datetime.now()
+        self.write(vals)
+
+    def _write_evidence_package(self, fileobj, relation):
+        """Escribe en fileobj un ZIP con la relación y las evidencias validadas.
+
+        relation es el Excel ya escrito por este mismo trabajo: no se vuelve
+        a armar. Las evidencias son las de included_control_ids que quien
+        pidió la relación puede leer; cada control es una carpeta con su
+        folio. El ZIP se escribe entrada por entrada: los archivos se copian
+        desde el filestore y las evidencias se leen por bloques, así que el
+        paquete de un cierre de mes (varios GB) nunca está completo en
+        memoria.
+        """
+        self.ensure_one()
+        Document = self.env['delivery.evidence.document']
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED, allowZip64=True) as package:
+            relation.seek(0)
+            with package.open(_('relacion.xlsx'), 'w', force_zip64=True) as entry:
+                shutil.copyfileobj(relation, entry)
+
+            used = set()
+            for batch_ids in split_every(REPORT_CHUNK_SIZE, self.included_control_ids.ids):
+                docs = Document.search(
+                    [('control_id', 'in', batch_ids), ('state', '=', 'validated')],
+                    order='control_id, id')
+                attachments = {
+                    attachment.res_id: attachment
+                    for attachment in self.env['ir.attachment'].sudo().search([
+                        ('res_model', '=', Document._name),
+                        ('res_field', '=', 'file'),
+                        ('res_id', 'in', docs.ids),
+                    ])
+                }
+                for doc in docs:
+                    attachment = attachments.get(doc.id)
+                    if not attachment:
+                        continue
+                    arcname = self._package_arcname(doc, used)
+                    with package.open(arcname, 'w', force_zip64=True) as entry:
+                        if attachment.store_fname:
+                            with open(attachment._full_path(attachment.store_fname), 'rb') as source:
+                                shutil.copyfileobj(source, entry)
+                        else:
+                            entry.write(attachment.raw or b'')
+                self.env.invalidate_all()
+
+    @api.model
+    def _package_arcname(self, doc, used):
+        """Ruta única de la evidencia dentro del ZIP: <folio>/<archivo>."""
+        folder = ARCNAME_UNSAFE.sub('_', doc.control_id.name or str(doc.control_id.id))
+        file_name = ARCNAME_UNSAFE.sub('_', doc.file_name or doc.name)
+        arcname = '%s/%s' % (folder, file_name)
+        stem, dot, ext = file_name.rpartition('.')
+        if not dot:
+            stem, ext = file_name, ''
+        counter = 2
+        while arcname in used:
+            arcname = '%s/%s (%s)%s' % (folder, stem, counter, dot + ext)
+            counter += 1
+        used.add(arcname)
+        return arcname
+
+    def _notify_requesters(self):
+        self.ensure_one()
+        if self.state == 'done':
+            payload = {
+                'type': 'success',
+                'title': _('Relación lista'),
+                'message': _('%(name)s: %(count)s controles. Descárgala desde el '
+                             'Centro de operación o Reportes → Relaciones generadas.') % {
+                    'name': self.name, 'count': self.control_count},
+            }
+        else:
+            payload = {
+                'type': 'danger',
+                'title': _('No se pudo generar la relación'),
+                'message': '%s: %s' % (self.name, self.error or ''),
+                'sticky': True,
+            }
+        self.requester_ids._bus_send('simple_notification', payload)
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Arma las relaciones en cola en orden de llegada, una por
+        transacción, y avisa a sus solicitantes."""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        for job in self.search([('state', 'in', ['queued', 'running'])], order='id'):
+            job.write({'state': 'running', 'date_start': fields.Datetime.now()})
+            if auto_commit:
+                self.env.cr.commit()
+            try:
+                job._build_file()
+            except Exception as error:
+                if auto_commit:
+                    self.env.cr.rollback()
+                if not isinstance(error, UserError):
+                    _logger.exception(
+                        'Control de Entregas y Evidencias: falló la relación %s.', job.id)
+                job.write({
+                    'state': 'failed',
+                    'error': str(error),
+                    'date_end': fields.Datetime.now(),
+                })
+            job._notify_requesters()
+            if auto_commit:
+                self.env.cr.commit()
+        return True
+
+    @api.autovacuum
+    def _gc_old_jobs(self):
+        """Borra los trabajos viejos junto con su archivo adjunto."""
+        limit = fields.Datetime.now() - timedelta(days=REPORT_JOB_RETENTION_DAYS)
+        self.search([('create_date', '<', limit), ('state', 'in', ['done', 'failed'])]).unlink()
+
+    # ==================================================================
+    # API para la aplicación OWL
+    # ==================================================================
+    @api.model
+    def _js_recent(self, limit=5):
+        """Últimas relaciones pedidas por el usuario, para el Centro de operación."""
+        jobs = self.search([('requester_ids', 'in', self.env.user.id)], limit=limit)
+        return [{
+            'id': job.id,
+            'name': job.name,
+            'state': job.state,
+            'count': job.control_count,
+            'url': job.download_url or '',
+            'package_url': job.package_url or '',
+            'error': job.error or '',
+        } for job in jobs]
+
+    def action_retry(self):
+        """Vuelve a encolar una relación con error."""
+        self.write({'state': 'queued', 'error': False, 'date_end': False})
+        self.env.ref('restricciones_entregas.ir_cron_delivery_evidence_report_jobs')._trigger()
+        return True
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Sincronización de ventas en segundo plano.
+
+Un rango grande (un año de ventas) no cabe en una sola petición HTTP: el
+trabajo procesa las ventas por bloques de tamaño fijo, confirma la
+transacción después de cada bloque y guarda como cursor el último id de
+sale.order procesado, así que se reanuda donde se quedó si el worker se
+reinicia. Lo despacha un ir.cron y la app consulta el avance.
+"""
+import logging
+import threading
+import time
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+SYNC_JOB_STATES = [
+    ('queued', 'En cola'),
+    ('running', 'En proceso'),
+    ('done', 'Terminado'),
+    ('failed', 'Con error'),
+]
+
+
+class DeliveryEvidenceSyncJob(models.Model):
+    _name = 'delivery.evidence.sync.job'
+    _description = 'Sincronización de ventas en segundo plano'
+    _order = 'id desc'
+
+    name = fields.Char('Descripción', required=True)
+    state = fields.Selection(
+        SYNC_JOB_STATES, 'Estado', default='queued', required=True, index=True)
+    user_id = fields.Many2one(
+        'res.users', 'Solicitó', default=lambda self: self.env.user, readonly=True)
+    company_id = fields.Many2one('res.company', 'Compañía')
+    date_from = fields.Datetime('Ventas desde')
+    date_to = fields.Datetime('Ventas hasta')
+    partner_ids = fields.Many2many('res.partner', string='Clientes')
+    chunk_size = fields.Integer('Ventas por bloque', default=200)
+    cursor_id = fields.Integer(
+        'Última venta procesada', readonly=True,
+        help='Id de la última sale.order procesada; el siguiente bloque empieza después.')
+    total_count = fields.Integer('Ventas a revisar', readonly=True)
+    processed_count = fields.Integer('Revisadas', readonly=True)
+    created_count = fields.Integer('Controles creados', readonly=True)
+    updated_count = fields.Integer('Controles actualizados', readonly=True)
+    skipped_count = fields.Integer('Omitidas', readonly=True)
+    review_count = fields.Integer('Requieren revisión', readonly=True)
+    progress = fields.Float('% avance', compute='_compute_progress')
+    date_start = fields.Datetime('Inicio', readonly=True)
+    date_end = fields.Datetime('Fin', readonly=True)
+    error = fields.Text('Error', readonly=True)
+
+    @api.depends('processed_count', 'total_count', 'state')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done':
+                job.progress = 100.0
+            elif job.total_count:
+                job.progress = min(100.0 * job.processed_count / job.total_count, 100.0)
+            else:
+                job.progress = 0.0
+
+    # ==================================================================
+    # Encolado
+    # ==================================================================
+    def _order_domain(self):
+        self.ensure_one()
+        domain = [('state', 'in', ['sale', 'done'])]
+        if self.company_id:
+            domain.append(('company_id', '=', self.company_id.id))
+        if self.date_from:
+            domain.append(('date_order', '>=', self.date_from))
+        if self.date_to:
+            domain.append(('date_order', '<=', self.date_to))
+        if self.partner_ids:
+            domain.append(('partner_id', 'in', self.partner_ids.ids))
+        return domain
+
+    @api.model
+    def _enqueue(self, vals):
+        """Crea el trabajo, cuenta las ventas a revisar y despierta el cron."""
+        job = self.create(vals)
+        job.total_count = self.env['sale.order'].search_count(job._order_domain())
+        self.env.ref('restricciones_entregas.ir_cron_delivery_evidence_sync_jobs')._trigger()
+        return job
+
+    # ==================================================================
+    # Procesamiento por bloques
+    # ==================================================================
+    def _process_chunk(self):
+        """Sincroniza el siguiente bloque; regresa False si ya no quedan ventas."""
+        self.ensure_one()
+        job = self.with_user(self.user_id)
+        orders = job.env['sale.order'].search(
+            job._order_domain() + [('id', '>', self.cursor_id)],
+            order='id', limit=self.chunk_size or 200)
+        if not orders:
+            self.write({'state': 'done', 'date_end': fields.Datetime.now()})
+            return False
+        stats = job.env['delivery.evidence.control']._sync_from_orders(orders)
+        self.write({
+            'cursor_id': orders[-1].id,
+            'processed_count': self.processed_count + len(orders),
+            'created_count': self.created_count + stats['created'],
+            'updated_count': self.updated_count + stats['updated'],
+            'skipped_count': self.skipped_count + stats['skipped'],
+            'review_count': self.review_count + stats['review'],
+        })
+        return True
+
+    @api.model
+    def _cron_process_jobs(self, time_budget=240):
+        """Procesa los trabajos en orden, confirmando después de cada bloque.
+
+        Si se agota el tiempo asignado, el cron se vuelve a disparar y el
+        trabajo continúa desde su cursor.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        deadline = time.monotonic() + time_budget
+        for job in self.search([('state', 'in', ['queued', 'running'])], order='id'):
+            if job.state == 'queued':
+                job.write({'state': 'running', 'date_start': fields.Datetime.now()})
+            more = True
+            while more and time.monotonic() < deadline:
+                try:
+                    more = job._process_chunk()
+                except Exception as error:
+                    if auto_commit:
+                        self.env.cr.rollback()
+                    _logger.exception(
+                        'Control de Entregas y Evidencias: falló la sincronización %s.', job.id)
+                    job.write({
+                        'state': 'failed',
+                        'error': str(error),
+                        'date_end': fields.Datetime.now(),
+                    })
+                    more = False
+                if auto_commit:
+                    self.env.cr.commit()
+            if more:
+                self.env.ref('restricciones_entregas.ir_cron_delivery_evidence_sync_jobs')._trigger()
+                break
+        return True
+
+    # ==================================================================
+    # API para la aplicación OWL
+    # ==================================================================
+    def _js_status(self):
+        self.ensure_one()
+        return {
+            'id': self.id,
+            'state': self.state,
+            'total': self.total_count,
+            'processed': self.processed_count,
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'skipped': self.skipped_count,
+            'review': self.review_count,
+            'progress': round(self.progress, 1),
+            'error': self.error or '',
+        }
+
+    def action_retry(self):
+        """Reanuda un trabajo con error desde su cursor."""
+        self.write({'state': 'queued', 'error': False, 'date_end': False})
+        self.env.ref('restricciones_entregas.ir_cron_delivery_evidence_sync_jobs')._trigger()
+        return True
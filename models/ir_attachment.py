@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import os
+import tempfile
+
+from odoo import api, models, _
+from odoo.exceptions import UserError
+
+# Bloque de copia hacia el filestore: el archivo nunca se carga completo.
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Permisos con que _file_write deja los blobs (0666 menos el umask); el
+# temporal nace en 0600 y se ajusta antes de moverlo. El umask solo puede
+# leerse cambiándolo, así que se lee una vez al importar.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+FILESTORE_FILE_MODE = 0o666 & ~_UMASK
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    @api.model
+    def _stream_to_store(self, fileobj, hashers=(), max_size=None):
+        """Copia fileobj al almacenamiento de adjuntos por bloques.
+
+        Con filestore el contenido va directo a su ruta definitiva (sha1)
+        sin pasar completo por memoria; con almacenamiento en base de datos
+        no queda más remedio que leerlo. ``hashers`` recibe cada bloque
+        (ej. el sha256 de las evidencias) y ``max_size`` limita los bytes.
+
+        Devuelve los valores que espera :meth:`_create_stored`.
+        """
+        to_file = self._storage() == 'file'
+        if to_file:
+            directory = self._filestore()
+            os.makedirs(directory, exist_ok=True)
+            sink = tempfile.NamedTemporaryFile(dir=directory, prefix='.stream-', delete=False)
+        else:
+            sink = io.BytesIO()
+        sha1, size = hashlib.sha1(), 0
+        try:
+            with sink:
+                for chunk in iter(lambda: fileobj.read(COPY_CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise UserError(_(
+                            'El archivo excede el tamaño máximo permitido (%s MB).'
+                        ) % (max_size // (1024 * 1024)))
+                    sha1.update(chunk)
+                    for hasher in hashers:
+                        hasher.update(chunk)
+                    sink.write(chunk)
+                if not to_file:
+                    return {'raw': sink.getvalue()}
+        except BaseException:
+            if to_file:
+                os.unlink(sink.name)
+            raise
+
+        checksum = sha1.hexdigest()
+        fname = '%s/%s' % (checksum[:2], checksum)
+        full_path = self._full_path(fname)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if os.path.exists(full_path):
+            # Mismo contenido ya almacenado: se reutiliza, como _file_write.
+            os.unlink(sink.name)
+        else:
+            os.chmod(sink.name, FILESTORE_FILE_MODE)
+            os.replace(sink.name, full_path)
+        self._mark_for_gc(fname)
+        return {'store_fname': fname, 'checksum': checksum, 'file_size': size}
+
+    @api.model
+    def _create_stored(self, vals, stored):
+        """Crea el adjunto apuntando al contenido de :meth:`_stream_to_store`.
+
+        create() ignora store_fname, checksum y file_size, por eso se
+        escriben por SQL después de crear el registro.
+        """
+        if 'raw' in stored:
+            return self.create(dict(vals, raw=stored['raw']))
+        attachment = self.create(vals)
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, checksum = %s, file_size = %s
+             WHERE id = %s
+        """, (stored['store_fname'], stored['checksum'], stored['file_size'], attachment.id))
+        attachment.invalidate_recordset()
+        return attachment
+
+    @api.model
+    def _create_from_file(self, fileobj, vals, max_size=None):
+        """Adjunto a partir de un archivo abierto, copiado por bloques."""
+        return self._create_stored(vals, self._stream_to_store(fileobj, max_size=max_size))
@@ -0,0 +1,24 @@
+from odoo import models, tools
+from odoo.tools import frozendict
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    @tools.ormcache('self.id')
+    def _delivery_permissions(self):
+        """Permisos del módulo para el usuario, evaluados una sola vez.
+
+        El resultado queda en caché por usuario; Odoo la limpia cuando
+        cambian los grupos de un usuario o los usuarios de un grupo.
+        """
+        self.ensure_one()
+        is_system = self.has_group('base.group_system')
+        return frozendict({
+            'edit_commitment_date': is_system or self.has_group(
+                'restricciones_entregas.group_edit_commitment_date'),
+            'edit_commitment_date_confirmed': is_system or self.has_group(
+                'restricciones_entregas.group_edit_commitment_date_confirmed'),
+            'evidence_manager': self.has_group(
+                'restricciones_entregas.group_delivery_evidence_manager'),
+        })
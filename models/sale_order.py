@@ -1,5 +1,9 @@
-from odoo import models, fields, api
+from collections import defaultdict
 from datetime import timedelta
+
+from markupsafe import Markup
+
+from odoo import models, fields, api
 from odoo.exceptions import UserError
 
 # Corte del esquema de programación por línea: 17-ago-2026 12:00 p.m.
@@ -7,6 +11,21 @@ from odoo.exceptions import UserError
 # Única definición: sale_order_line.py la importa de aquí.
 DELIVERY_LINE_CUTOFF = '2026-08-17 18:00:00'
 
+# Campos cuyo cambio se deja en el chatter de la orden, en un solo mensaje
+# por orden y por escritura.
+ORDER_TRACK_FIELDS = ['commitment_date', 'client_order_ref', 'warehouse_id', 'pricelist_id']
+LINE_TRACK_FIELDS = ['product_id', 'name', 'product_uom', 'product_uom_qty', 'price_unit']
+TRACKING_BUFFER_KEY = 'restricciones_entregas.line_tracking'
+COMMITMENT_SYNC_KEY = 'restricciones_entregas.commitment_sync'
+
+
+def _tracking_str(value):
+    if isinstance(value, models.BaseModel):
+        return value.display_name or 'N/A'
+    if value is False or value is None or value == '':
+        return 'N/A'
+    return str(value)
+
 
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
@@ -49,33 +68,21 @@ class SaleOrder(models.Model):
         )
 
     def _compute_can_edit_commitment_date(self):
+        permissions = self.env.user._delivery_permissions()
         for order in self:
             if order.state in ['draft', 'sent']:
-                order.can_edit_commitment_date = (
-                    self.env.user.has_group('restricciones_entregas.group_edit_commitment_date')
-                    or self.env.user.has_group('base.group_system')
-                )
+                order.can_edit_commitment_date = permissions['edit_commitment_date']
             else:
-                order.can_edit_commitment_date = (
-                    self.env.user.has_group('restricciones_entregas.group_edit_commitment_date_confirmed')
-                    or self.env.user.has_group('base.group_system')
-                )
+                order.can_edit_commitment_date = permissions['edit_commitment_date_confirmed']
 
     def _check_commitment_date_permissions(self):
+        permissions = self.env.user._delivery_permissions()
         for order in self:
             if order.state in ['draft', 'sent']:
-                allowed = (
-                    self.env.user.has_group('restricciones_entregas.group_edit_commitment_date')
-                    or self.env.user.has_group('base.group_system')
-                )
-                if not allowed:
+                if not permissions['edit_commitment_date']:
                     raise UserError("No tienes permisos para modificar la fecha de entrega en cotizaciones.")
             else:
-                allowed = (
-                    self.env.user.has_group('restricciones_entregas.group_edit_commitment_date_confirmed')
-                    or self.env.user.has_group('base.group_system')
-                )
-                if not allowed:
+                if not permissions['edit_commitment_date_confirmed']:
                     raise UserError("No tienes permisos para modificar la fecha de entrega en órdenes confirmadas.")
 
     def _minimum_allowed_commitment_date(self):
@@ -112,16 +119,77 @@ class SaleOrder(models.Model):
         return min(pending_lines.mapped('report_commitment_date'))
 
     def _sync_commitment_date_from_lines(self):
-        for order in self:
-            # Las órdenes históricas (anteriores al corte) conservan su fecha
-            # global intacta: ningún proceso automático puede reescribirla.
-            if not order.use_line_delivery_schedule:
-                continue
-            next_date = order._get_next_pending_line_commitment_date()
-            if next_date and order.commitment_date != next_date:
-                super(SaleOrder, order.with_context(skip_commitment_line_sync=True)).write({
-                    'commitment_date': next_date
-                })
+        """Lleva commitment_date a la próxima fecha pendiente de sus líneas.
+
+        Una sola consulta calcula, por orden, el MIN(report_commitment_date)
+        de las líneas pendientes (mismo criterio que
+        _get_pending_delivery_lines) y solo regresa las órdenes cuyo valor
+        difiere; se escriben agrupadas por fecha destino.
+        """
+        if not self:
+            return
+        self.env['sale.order.line'].flush_model([
+            'order_id', 'display_type', 'report_commitment_date',
+            'product_uom_qty', 'qty_delivered', 'show_in_delivery_report',
+        ])
+        self.flush_model(['use_line_delivery_schedule', 'commitment_date'])
+        # Las órdenes históricas (anteriores al corte) conservan su fecha
+        # global intacta: ningún proceso automático puede reescribirla.
+        self.env.cr.execute(
+            """
+            SELECT so.id, MIN(sol.report_commitment_date)
+            FROM sale_order so
+            JOIN sale_order_line sol ON sol.order_id = so.id
+            WHERE so.id = ANY(%s)
+              AND so.use_line_delivery_schedule
+              AND sol.display_type IS NULL
+              AND sol.report_commitment_date IS NOT NULL
+              AND sol.show_in_delivery_report
+              AND COALESCE(sol.product_uom_qty, 0) > COALESCE(sol.qty_delivered, 0)
+            GROUP BY so.id, so.commitment_date
+            HAVING so.commitment_date IS DISTINCT FROM MIN(sol.report_commitment_date)
+            """,
+            [self.ids],
+        )
+        order_ids_by_date = defaultdict(list)
+        for order_id, next_date in self.env.cr.fetchall():
+            order_ids_by_date[next_date].append(order_id)
+        for next_date, order_ids in order_ids_by_date.items():
+            orders = self.browse(order_ids).with_context(skip_commitment_line_sync=True)
+            super(SaleOrder, orders).write({'commitment_date': next_date})
+
+    def _schedule_commitment_date_sync(self):
+        """Encola la resincronización de commitment_date para antes del commit.
+
+        Validar un albarán o importar líneas escribe varias veces sobre las
+        mismas órdenes; con la cola cada orden se resincroniza una sola vez
+        por transacción.
+        """
+        if not self:
+            return
+        data = self.env.cr.precommit.data
+        pending = data.get(COMMITMENT_SYNC_KEY)
+        if pending is None:
+            pending = data[COMMITMENT_SYNC_KEY] = set()
+            self.env.cr.precommit.add(self._run_scheduled_commitment_date_sync)
+        pending.update(self.ids)
+
+    def _pop_scheduled_commitment_date_sync(self):
+        """Saca de la cola las órdenes de self que estaban pendientes."""
+        pending = self.env.cr.precommit.data.get(COMMITMENT_SYNC_KEY)
+        if not pending:
+            return self.browse()
+        orders = self.filtered(lambda o: o.id in pending)
+        pending.difference_update(orders.ids)
+        return orders
+
+    @api.model
+    def _run_scheduled_commitment_date_sync(self):
+        order_ids = self.env.cr.precommit.data.pop(COMMITMENT_SYNC_KEY, None)
+        if not order_ids:
+            return
+        self.browse(order_ids).exists()._sync_commitment_date_from_lines()
+        self.env.flush_all()
 
     def _assign_delivery_folio_numbers(self):
         """Asigna consecutivo de folio a las líneas de producto que no tengan uno.
@@ -129,7 +197,12 @@ class SaleOrder(models.Model):
         El consecutivo continúa a partir del máximo ya asignado en la orden:
         nunca se renumera ni se reutiliza, para que el folio (ej. S00300-2)
         sea estable como referencia de seguimiento y planificación.
+
+        Los números se calculan en memoria y se escriben agrupados: una
+        escritura por consecutivo (todas las líneas "-1", todas las "-2"...)
+        en lugar de una por línea.
         """
+        line_ids_by_number = defaultdict(list)
         for order in self:
             if not order.use_line_delivery_schedule:
                 continue
@@ -137,8 +210,11 @@ class SaleOrder(models.Model):
             next_number = max(product_lines.mapped('delivery_folio_number') or [0]) + 1
             for line in product_lines.sorted(key=lambda l: (l.sequence, l.id)):
                 if not line.delivery_folio_number:
-                    line.delivery_folio_number = next_number
+                    line_ids_by_number[next_number].append(line.id)
                     next_number += 1
+        lines = self.env['sale.order.line']
+        for number, line_ids in line_ids_by_number.items():
+            lines.browse(line_ids).write({'delivery_folio_number': number})
 
     def _has_multiple_pending_line_dates(self):
         self.ensure_one()
@@ -159,19 +235,70 @@ class SaleOrder(models.Model):
                         'line_commitment_date': order.commitment_date
                     })
 
-            order._sync_commitment_date_from_lines()
+        # Lo que las líneas dejaron en cola se resuelve aquí, en una pasada.
+        orders._pop_scheduled_commitment_date_sync()
+        orders._sync_commitment_date_from_lines()
 
         return orders
 
+    @api.model
+    def _tracking_buffer(self):
+        """Renglones de cambios de líneas pendientes de publicar, por orden.
+
+        Las líneas los acumulan al escribirse; SaleOrder.write los publica
+        junto con los de la orden, y lo que quede (líneas escritas
+        directamente) se publica una vez antes del commit.
+        """
+        data = self.env.cr.precommit.data
+        buffer = data.get(TRACKING_BUFFER_KEY)
+        if buffer is None:
+            buffer = data[TRACKING_BUFFER_KEY] = defaultdict(list)
+            self.env.cr.precommit.add(self._flush_tracking_buffer)
+        return buffer
+
+    @api.model
+    def _queue_tracking_rows(self, rows_by_order):
+        if not rows_by_order:
+            return
+        buffer = self._tracking_buffer()
+        for order_id, rows in rows_by_order.items():
+            buffer[order_id].extend(rows)
+
+    def _pop_tracking_rows(self):
+        buffer = self.env.cr.precommit.data.get(TRACKING_BUFFER_KEY)
+        if not buffer:
+            return {}
+        return {order_id: buffer.pop(order_id) for order_id in self.ids if order_id in buffer}
+
+    @api.model
+    def _flush_tracking_buffer(self):
+        buffer = self.env.cr.precommit.data.pop(TRACKING_BUFFER_KEY, None)
+        if not buffer:
+            return
+        self.browse(list(buffer)).exists()._post_tracking_changes(buffer)
+        self.env.flush_all()
+
+    def _post_tracking_changes(self, changes):
+        """Un solo mensaje por orden con la tabla de cambios (campo, antes, ahora)."""
+        user_name = self.env.user.display_name
+        row_template = Markup('<tr><td>%s</td><td>%s</td><td>%s</td></tr>')
+        for order in self:
+            rows = changes.get(order.id)
+            if not rows:
+                continue
+            body = Markup(
+                '<p>Cambios en el pedido %s - Usuario: %s</p>'
+                '<table class="table table-sm table-bordered">'
+                '<thead><tr><th>Campo</th><th>Antes</th><th>Ahora</th></tr></thead>'
+                '<tbody>%s</tbody></table>'
+            ) % (order.name, user_name, Markup('').join(row_template % row for row in rows))
+            order.message_post(body=body, message_type='comment', subtype_xmlid='mail.mt_note')
+
     def write(self, vals):
+        track_fields = [f for f in ORDER_TRACK_FIELDS if f in vals]
         old_values = {}
-        track_fields = ['commitment_date', 'client_order_ref', 'warehouse_id', 'pricelist_id']
-        track_line_fields = ['product_id', 'name', 'product_uom', 'product_uom_qty', 'price_unit']
-
-        for field_name in track_fields:
-            if field_name in vals:
-                for order in self:
-                    old_values.setdefault(order.id, {})[field_name] = getattr(order, field_name)
+        for order in self:
+            old_values[order.id] = {f: _tracking_str(order[f]) for f in track_fields}
 
         if 'commitment_date' in vals and not self.env.context.get('skip_commitment_line_sync'):
             self._check_commitment_date_permissions()
@@ -196,32 +323,22 @@ class SaleOrder(models.Model):
                             'line_commitment_date': order.commitment_date
                         })
 
-        user_name = self.env.user.display_name
+        # Las órdenes que sus líneas dejaron en cola se resincronizan ya, para
+        # que la escritura termine con la fecha global al día.
+        self._pop_scheduled_commitment_date_sync()._sync_commitment_date_from_lines()
+
+        # Los cambios de líneas los registró SaleOrderLine al escribirse.
+        line_changes = self._pop_tracking_rows()
+        changes = {}
         for order in self:
+            rows = []
             for field_name in track_fields:
-                if field_name in vals:
-                    old_value = old_values[order.id].get(field_name)
-                    new_value = getattr(order, field_name)
-                    if old_value != new_value:
-                        old_str = old_value and str(old_value) or 'N/A'
-                        new_str = new_value and str(new_value) or 'N/A'
-                        message = (
-                            f"Cambio en {field_name.replace('_', ' ').capitalize()} - Pedido: {order.name} - Usuario: {user_name} "
-                            f"- Antes: {old_str} - Ahora: {new_str}"
-                        )
-                        order.message_post(body=message, message_type='comment', subtype_xmlid='mail.mt_note')
-
-            for line in order.order_line:
-                for field_name in track_line_fields:
-                    old_value = line._origin and line._origin[field_name] or 'N/A'
-                    new_value = getattr(line, field_name)
-                    if old_value != new_value:
-                        old_str = old_value and str(old_value) or 'N/A'
-                        new_str = new_value and str(new_value) or 'N/A'
-                        message = (
-                            f"Cambio en {field_name.replace('_', ' ').capitalize()} en línea de pedido ({line.product_id.display_name}) - Pedido: {order.name} - Usuario: {user_name} "
-                            f"- Antes: {old_str} - Ahora: {new_str}"
-                        )
-                        order.message_post(body=message, message_type='comment', subtype_xmlid='mail.mt_note')
-
-        return res
\ No newline at end of file
+                old_str = old_values[order.id][field_name]
+                new_str = _tracking_str(order[field_name])
+                if old_str != new_str:
+                    rows.append((order._fields[field_name].string, old_str, new_str))
+            rows.extend(line_changes.get(order.id, []))
+            changes[order.id] = rows
+        self._post_tracking_changes(changes)
+
+        return res
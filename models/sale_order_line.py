@@ -1,8 +1,11 @@
-from odoo import models, fields, api
+from collections import defaultdict
 from datetime import timedelta, date
+
+from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.tools import split_every
 
-from .sale_order import DELIVERY_LINE_CUTOFF
+from .sale_order import DELIVERY_LINE_CUTOFF, LINE_TRACK_FIELDS, _tracking_str
 
 
 class SaleOrderLine(models.Model):
@@ -158,6 +161,68 @@ class SaleOrderLine(models.Model):
             else:
                 line.delivery_line_status = 'Pendiente'
 
+    @api.model
+    def _cron_refresh_delivery_status(self, batch_size=1000):
+        """Actualiza los campos del reporte que dependen de la fecha de hoy.
+
+        delivery_days_remaining y delivery_line_status se guardan, pero su
+        valor cambia con el calendario y ninguna dependencia los dispara.
+        Los días restantes se descuentan con un UPDATE directo solo donde
+        cambian, y el estatus se recalcula únicamente en las líneas que hoy
+        cruzan una frontera (Pendiente → Próxima a dos días, Pendiente o
+        Próxima → Vencida), sin reescribir toda la tabla.
+        """
+        today = date.today()
+        self.flush_model([
+            'display_type', 'report_commitment_date',
+            'delivery_days_remaining', 'delivery_line_status',
+        ])
+
+        self.env.cr.execute(
+            """
+            UPDATE sale_order_line
+            SET delivery_days_remaining = GREATEST(report_commitment_date::date - %(today)s, 0)
+            WHERE display_type IS NULL
+              AND report_commitment_date IS NOT NULL
+              AND delivery_days_remaining IS DISTINCT FROM
+                  GREATEST(report_commitment_date::date - %(today)s, 0)
+            """,
+            {'today': today},
+        )
+        self.invalidate_model(['delivery_days_remaining'])
+
+        self.env.cr.execute(
+            """
+            SELECT id
+            FROM sale_order_line
+            WHERE display_type IS NULL
+              AND report_commitment_date IS NOT NULL
+              AND (
+                  (delivery_line_status = 'Pendiente'
+                   AND report_commitment_date::date <= %(soon)s)
+                  OR (delivery_line_status = 'Próxima'
+                      AND report_commitment_date::date < %(today)s)
+              )
+            ORDER BY id
+            """,
+            {'today': today, 'soon': today + timedelta(days=2)},
+        )
+        line_ids = [row[0] for row in self.env.cr.fetchall()]
+
+        status_fields = [self._fields['delivery_line_status'], self._fields['delivery_days_remaining']]
+        for batch_ids in split_every(batch_size, line_ids):
+            lines = self.browse(batch_ids)
+            for field in status_fields:
+                self.env.add_to_compute(field, lines)
+            lines.flush_recordset()
+            self.env.invalidate_all()
+        return len(line_ids)
+
+    def _tracking_label(self):
+        self.ensure_one()
+        folio = f" [{self.delivery_folio}]" if self.delivery_folio else ""
+        return f"Línea{folio} ({self.product_id.display_name or self.name})"
+
     def _minimum_allowed_line_commitment_date(self):
         self.ensure_one()
         base_dt = self.order_id.date_order or fields.Datetime.now()
@@ -198,8 +263,17 @@ class SaleOrderLine(models.Model):
 
         lines.mapped('order_id')._assign_delivery_folio_numbers()
 
+        # Solo se registran las líneas agregadas a una orden ya existente: en
+        # la misma transacción orden y líneas comparten create_date.
+        added = defaultdict(list)
+        for line in lines:
+            if not line.display_type and line.order_id and line.order_id.create_date != line.create_date:
+                added[line.order_id.id].append((
+                    f"{line._tracking_label()} · Línea agregada", 'N/A', _tracking_str(line.product_id)))
+        self.env['sale.order']._queue_tracking_rows(added)
+
         if not self.env.context.get('skip_order_commitment_sync'):
-            lines.mapped('order_id')._sync_commitment_date_from_lines()
+            lines.mapped('order_id')._schedule_commitment_date_sync()
 
         for line in lines.filtered(lambda l: not l.display_type and l.order_id and l.line_commitment_date):
             folio = f" [{line.delivery_folio}]" if line.delivery_folio else ""
@@ -215,6 +289,15 @@ class SaleOrderLine(models.Model):
         return lines
 
     def write(self, vals):
+        # Foto de los campos rastreados solo si la escritura los toca: las
+        # escrituras ajenas (confirmación, estados, cantidades entregadas)
+        # no leen nada de más.
+        track_fields = [f for f in LINE_TRACK_FIELDS if f in vals]
+        old_tracked = {}
+        if track_fields:
+            for line in self.filtered(lambda l: not l.display_type):
+                old_tracked[line.id] = {f: _tracking_str(line[f]) for f in track_fields}
+
         old_dates = {}
         if 'line_commitment_date' in vals:
             for line in self:
@@ -238,11 +321,33 @@ class SaleOrderLine(models.Model):
                         subtype_xmlid='mail.mt_note'
                     )
 
+        if old_tracked:
+            rows = defaultdict(list)
+            for line in self.browse(list(old_tracked)):
+                label = line._tracking_label()
+                for field_name in track_fields:
+                    old_str = old_tracked[line.id][field_name]
+                    new_str = _tracking_str(line[field_name])
+                    if old_str != new_str:
+                        rows[line.order_id.id].append((
+                            f"{label} · {line._fields[field_name].string}", old_str, new_str))
+            self.env['sale.order']._queue_tracking_rows(rows)
+
         # La fecha global solo se resincroniza cuando cambió algo que la
         # determina. Una escritura ajena (folios, migraciones, etc.) no debe
-        # tocar sale_order.commitment_date.
+        # tocar sale_order.commitment_date. Se encola: varias escrituras en
+        # la misma transacción resincronizan cada orden una sola vez.
         sync_trigger_fields = {'line_commitment_date', 'product_uom_qty', 'qty_delivered'}
         if sync_trigger_fields & vals.keys() and not self.env.context.get('skip_order_commitment_sync'):
-            self.mapped('order_id')._sync_commitment_date_from_lines()
-
-        return res
\ No newline at end of file
+            self.mapped('order_id')._schedule_commitment_date_sync()
+
+        return res
+
+    def unlink(self):
+        removed = defaultdict(list)
+        for line in self.filtered(lambda l: not l.display_type and l.order_id):
+            removed[line.order_id.id].append((
+                f"{line._tracking_label()} · Línea eliminada", _tracking_str(line.product_id), 'N/A'))
+        res = super().unlink()
+        self.env['sale.order']._queue_tracking_rows(removed)
+        return res
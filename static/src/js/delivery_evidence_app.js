@@ -1,10 +1,16 @@
 /** @odoo-module **/
 
 import { registry } from "@web/core/registry";
-import { Component, useState, onWillStart } from "@odoo/owl";
+import { Component, useState, onWillStart, onWillUnmount } from "@odoo/owl";
 import { useService } from "@web/core/utils/hooks";
+import { useDebounced } from "@web/core/utils/timing";
 
 const CTRL = "delivery.evidence.control";
+const EXCEL_MATCH_URL = "/restricciones_entregas/match_excel";
+const EVIDENCE_UPLOAD_URL = "/restricciones_entregas/upload_evidence";
+
+// Evidencias que se suben a la vez cuando se eligen varios archivos.
+const UPLOAD_CONCURRENCY = 3;
 
 const TABS = [
     { id: "all", label: "Todas" },
@@ -25,6 +31,17 @@ const DOC_LABELS = {
     sent: "Enviada",
 };
 
+// Paginación por llave de la lista: renglones por página y distancia al
+// fondo (px) a la que se pide la siguiente.
+const PAGE_SIZE = 80;
+const SCROLL_THRESHOLD_PX = 200;
+
+// Espera (ms) tras la última tecla antes de consultar el buscador.
+const SEARCH_DEBOUNCE_MS = 250;
+
+// Cada cuánto se consulta el avance de la sincronización en segundo plano.
+const SYNC_POLL_MS = 2000;
+
 /**
  * Entregas y Evidencias — Centro de operación.
  *
@@ -41,6 +58,9 @@ export class DeliveryEvidenceApp extends Component {
         this.orm = useService("orm");
         this.action = useService("action");
         this.notification = useService("notification");
+        this.busService = useService("bus_service");
+        this._listRequest = 0;
+        this.debouncedReloadList = useDebounced(() => this.reloadList(), SEARCH_DEBOUNCE_MS);
 
         this.state = useState({
             loading: true,
@@ -48,11 +68,16 @@ export class DeliveryEvidenceApp extends Component {
             tab: "all",
             search: "",
             rows: [],
+            total: 0,
+            nextCursor: false, // llave (fecha, id) de la página siguiente
+            loadingMore: false,
             detail: null,      // control abierto en el panel
             busy: false,
+            uploading: 0,      // evidencias en subida
             uploadType: "remision_firmada",
             excel: { open: false, matches: [], selected: {}, scanning: false, fileName: "" },
             confirm: null,     // acción en confirmación de dos pasos
+            sync: null,        // avance de la sincronización en segundo plano
         });
 
         onWillStart(async () => {
@@ -60,6 +85,13 @@ export class DeliveryEvidenceApp extends Component {
             await this.reloadList();
             this.state.loading = false;
         });
+        onWillUnmount(() => clearTimeout(this._syncTimer));
+
+        // El aviso de "relación lista" llega por el bus; refresca la lista
+        // de relaciones recientes para mostrar el enlace de descarga.
+        const onReportNotification = () => this.reloadBootstrap();
+        this.busService.subscribe("simple_notification", onReportNotification);
+        onWillUnmount(() => this.busService.unsubscribe("simple_notification", onReportNotification));
     }
 
     // ------------------------------------------------------------------
@@ -70,9 +102,39 @@ export class DeliveryEvidenceApp extends Component {
     }
 
     async reloadList() {
-        this.state.rows = await this.orm.call(CTRL, "js_list", [
-            this.state.tab, this.state.search,
+        // Cada consulta invalida las anteriores: si el usuario siguió
+        // escribiendo, la respuesta vieja se descarta al llegar.
+        const request = ++this._listRequest;
+        const page = await this.orm.call(CTRL, "js_list", [
+            this.state.tab, this.state.search, PAGE_SIZE,
         ]);
+        if (request !== this._listRequest) return;
+        this.state.rows = page.rows;
+        this.state.total = page.total;
+        this.state.nextCursor = page.next_cursor;
+    }
+
+    async loadMore() {
+        if (!this.state.nextCursor || this.state.loadingMore) return;
+        this.state.loadingMore = true;
+        const request = this._listRequest;
+        try {
+            const page = await this.orm.call(CTRL, "js_list", [
+                this.state.tab, this.state.search, PAGE_SIZE, this.state.nextCursor,
+            ]);
+            if (request !== this._listRequest) return;
+            this.state.rows.push(...page.rows);
+            this.state.nextCursor = page.next_cursor;
+        } finally {
+            this.state.loadingMore = false;
+        }
+    }
+
+    onListScroll(ev) {
+        const list = ev.target;
+        if (list.scrollTop + list.clientHeight >= list.scrollHeight - SCROLL_THRESHOLD_PX) {
+            this.loadMore();
+        }
     }
 
     async setTab(tab) {
@@ -81,9 +143,9 @@ export class DeliveryEvidenceApp extends Component {
         await this.reloadList();
     }
 
-    async onSearch(ev) {
+    onSearch(ev) {
         this.state.search = ev.target.value;
-        await this.reloadList();
+        this.debouncedReloadList();
     }
 
     get tabs() {
@@ -161,12 +223,48 @@ export class DeliveryEvidenceApp extends Component {
     }
 
     async validateDocument(doc) {
+        await this._validateDocuments([doc.id]);
+    }
+
+    async validatePendingDocuments() {
+        const ids = this.state.detail.evidences.filter((e) => e.state === "draft").map((e) => e.id);
+        if (ids.length) {
+            await this._validateDocuments(ids);
+        }
+    }
+
+    get pendingEvidenceCount() {
+        return this.state.detail.evidences.filter((e) => e.state === "draft").length;
+    }
+
+    /**
+     * Valida varias evidencias en una llamada y aplica en sitio solo lo que
+     * cambió (estado de las evidencias y etapa de sus controles).
+     */
+    async _validateDocuments(ids) {
+        if (this.state.busy) return;
+        this.state.busy = true;
         try {
-            this.state.detail = await this.orm.call(CTRL, "js_validate_document", [
-                [this.state.detail.id], doc.id,
-            ]);
+            const changes = await this.orm.call(CTRL, "js_validate_documents", [ids]);
+            const docs = Object.fromEntries(changes.documents.map((d) => [d.id, d]));
+            for (const evidence of this.state.detail?.evidences || []) {
+                Object.assign(evidence, docs[evidence.id] || {});
+            }
+            for (const control of changes.controls) {
+                if (this.state.detail?.id === control.id) {
+                    this.state.detail.doc_state = control.doc_state;
+                    this.state.detail.evidence_received_date = control.evidence_received_date;
+                }
+                const row = this.state.rows.find((r) => r.id === control.id);
+                if (row) {
+                    row.doc_state = control.doc_state;
+                }
+            }
+            await this.reloadBootstrap();
         } catch (error) {
             this._notifyError(error);
+        } finally {
+            this.state.busy = false;
         }
     }
 
@@ -201,6 +299,7 @@ export class DeliveryEvidenceApp extends Component {
         const ids = this.state.detail ? [this.state.detail.id] : [];
         this.action.doAction("restricciones_entregas.action_delivery_evidence_report_wizard", {
             additionalContext: ids.length ? { default_control_ids: [[6, 0, ids]] } : {},
+            onClose: () => this.reloadBootstrap(),
         });
     }
 
@@ -212,29 +311,57 @@ export class DeliveryEvidenceApp extends Component {
     }
 
     async onFileSelected(ev) {
-        const file = ev.target.files && ev.target.files[0];
+        const files = [...(ev.target.files || [])];
         ev.target.value = "";
-        if (!file) return;
-        const b64 = await new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onload = () => resolve(reader.result.split(",")[1]);
-            reader.onerror = reject;
-            reader.readAsDataURL(file);
-        });
-        try {
-            this.state.detail = await this.orm.call(CTRL, "js_add_evidence", [
-                [this.state.detail.id],
-                {
-                    file: b64,
-                    file_name: file.name,
-                    name: file.name.replace(/\.[^.]+$/, ""),
-                    evidence_type: this.state.uploadType,
-                },
-            ]);
-            await this.reloadBootstrap();
-            this.notification.add("Evidencia cargada.", { type: "success" });
-        } catch (error) {
-            this._notifyError(error);
+        if (!files.length) return;
+        const controlId = this.state.detail.id;
+        const evidenceType = this.state.uploadType;
+        const queue = [...files];
+        const errors = [];
+        const duplicates = [];
+        let uploaded = 0;
+        this.state.uploading = files.length;
+        // Cada archivo va en su propia petición multipart, varias a la vez.
+        const worker = async () => {
+            while (queue.length) {
+                const file = queue.shift();
+                try {
+                    const result = await this._postFile(EVIDENCE_UPLOAD_URL, file, {
+                        control_id: controlId,
+                        name: file.name.replace(/\.[^.]+$/, ""),
+                        evidence_type: evidenceType,
+                    });
+                    if (result.duplicate) {
+                        duplicates.push(result.duplicate);
+                    } else {
+                        uploaded++;
+                    }
+                } catch (error) {
+                    errors.push(`${file.name}: ${error.message}`);
+                } finally {
+                    this.state.uploading--;
+                }
+            }
+        };
+        await Promise.all(
+            Array.from({ length: Math.min(UPLOAD_CONCURRENCY, files.length) }, worker));
+        if (this.state.detail && this.state.detail.id === controlId) {
+            this.state.detail = await this.orm.call(CTRL, "js_detail", [[controlId]]);
+        }
+        await this.reloadBootstrap();
+        if (uploaded) {
+            this.notification.add(
+                uploaded === 1 ? "Evidencia cargada." : `${uploaded} evidencias cargadas.`,
+                { type: "success" });
+        }
+        if (duplicates.length) {
+            this.notification.add(
+                duplicates.map((d) => `${d.file_name}: ya estaba cargada como "${d.document_name}".`)
+                    .join("\n"),
+                { type: "warning", title: "Evidencias repetidas" });
+        }
+        if (errors.length) {
+            this._notifyError(new Error(errors.join("\n")));
         }
     }
 
@@ -254,14 +381,8 @@ export class DeliveryEvidenceApp extends Component {
         if (!file) return;
         this.state.excel.scanning = true;
         this.state.excel.fileName = file.name;
-        const b64 = await new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onload = () => resolve(reader.result.split(",")[1]);
-            reader.onerror = reject;
-            reader.readAsDataURL(file);
-        });
         try {
-            const result = await this.orm.call(CTRL, "js_match_excel", [b64, file.name]);
+            const result = await this._postFile(EXCEL_MATCH_URL, file);
             this.state.excel.matches = result.matched;
             this.state.excel.diagnostics = result.diagnostics || [];
             this.state.excel.selected = Object.fromEntries(
@@ -276,6 +397,25 @@ export class DeliveryEvidenceApp extends Component {
         }
     }
 
+    /**
+     * Sube un archivo en binario (multipart) a una ruta HTTP del módulo y
+     * regresa su respuesta JSON; evita inflar el archivo en base64.
+     */
+    async _postFile(url, file, fields = {}) {
+        const body = new FormData();
+        body.append("file", file);
+        body.append("csrf_token", odoo.csrf_token);
+        for (const [key, value] of Object.entries(fields)) {
+            body.append(key, value);
+        }
+        const response = await fetch(url, { method: "POST", body });
+        const result = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            throw new Error(result.error || response.statusText);
+        }
+        return result;
+    }
+
     toggleExcelRow(row) {
         this.state.excel.selected[row.id] = !this.state.excel.selected[row.id];
     }
@@ -319,22 +459,45 @@ export class DeliveryEvidenceApp extends Component {
     // Sincronización rápida
     // ------------------------------------------------------------------
     async syncRecent() {
-        if (this.state.busy) return;
-        this.state.busy = true;
+        if (this.state.busy || this.state.sync) return;
         try {
-            const stats = await this.orm.call(CTRL, "js_sync_recent", [60]);
+            this.state.sync = await this.orm.call(CTRL, "js_sync_recent", [60]);
             this.notification.add(
-                `Sincronización (últimos 60 días): ${stats.total} ventas — ` +
-                `${stats.created} nuevas, ${stats.updated} actualizadas, ` +
-                `${stats.review} requieren revisión.`,
-                { type: "success" });
-            await this._refreshAll();
+                `Sincronización en segundo plano: ${this.state.sync.total} ventas por revisar.`,
+                { type: "info" });
+            this._pollSync();
         } catch (error) {
             this._notifyError(error);
-        } finally {
-            this.state.busy = false;
         }
     }
+
+    _pollSync() {
+        this._syncTimer = setTimeout(async () => {
+            try {
+                this.state.sync = await this.orm.call(CTRL, "js_sync_status", [this.state.sync.id]);
+            } catch (error) {
+                this.state.sync = null;
+                this._notifyError(error);
+                return;
+            }
+            const stats = this.state.sync;
+            if (stats.state === "done") {
+                this.notification.add(
+                    `Sincronización (últimos 60 días): ${stats.total} ventas — ` +
+                    `${stats.created} nuevas, ${stats.updated} actualizadas, ` +
+                    `${stats.review} requieren revisión.`,
+                    { type: "success" });
+                this.state.sync = null;
+                await this._refreshAll();
+            } else if (stats.state === "failed") {
+                this.notification.add(`La sincronización falló: ${stats.error}`,
+                    { type: "danger", sticky: true });
+                this.state.sync = null;
+            } else {
+                this._pollSync();
+            }
+        }, SYNC_POLL_MS);
+    }
 }
 
 registry.category("actions").add("delivery_evidence_app", DeliveryEvidenceApp);
@@ -1,70 +1,33 @@
 # -*- coding: utf-8 -*-
 """Relación en Excel para Administración.
 
-Usa xlsxwriter, dependencia estándar de Odoo. Las columnas reflejan el
-control alterno: la venta y las remisiones son de Odoo; la factura es la
-capturada de Compact (CONTPAQi).
+El asistente captura los filtros y encola un delivery.evidence.report.job;
+el archivo se arma en segundo plano (ver models/delivery_evidence_report_job.py).
 """
-import base64
-import io
-
 from odoo import fields, models, _
 from odoo.exceptions import UserError
 
-from ..models.delivery_evidence import DELIVERY_STATES, DOC_STATES
-
 
 class DeliveryEvidenceReportWizard(models.TransientModel):
     _name = 'delivery.evidence.report.wizard'
+    _inherit = 'delivery.evidence.report.mixin'
     _description = 'Relación de entregas y evidencias para Administración'
 
-    date_from = fields.Date('Fecha inicial')
-    date_to = fields.Date('Fecha final')
-    company_id = fields.Many2one(
-        'res.company', 'Compañía', default=lambda self: self.env.company)
-    partner_ids = fields.Many2many('res.partner', string='Clientes')
-    delivery_state = fields.Selection(DELIVERY_STATES, 'Estado de entrega')
-    doc_state = fields.Selection(DOC_STATES, 'Estado documental')
-    only_ready = fields.Boolean('Solo expedientes completos')
-    only_not_sent = fields.Boolean('Solo no enviados', default=True)
-    control_ids = fields.Many2many(
-        'delivery.evidence.control', string='Controles seleccionados')
     state = fields.Selection(
         [('choose', 'choose'), ('done', 'done')], default='choose')
-    file = fields.Binary('Relación', readonly=True)
-    file_name = fields.Char('Archivo')
-    included_ids = fields.Many2many(
-        'delivery.evidence.control', 'dec_report_included_rel',
-        string='Incluidos en la relación', readonly=True)
-
-    def _find_controls(self):
-        self.ensure_one()
-        if self.control_ids:
-            return self.control_ids
-        domain = []
-        if self.company_id:
-            domain.append(('company_id', '=', self.company_id.id))
-        if self.date_from:
-            domain.append(('order_date', '>=', self.date_from))
-        if self.date_to:
-            domain.append(('order_date', '<=', self.date_to))
-        if self.partner_ids:
-            domain.append(('partner_id', 'in', self.partner_ids.ids))
-        if self.delivery_state:
-            domain.append(('delivery_state', '=', self.delivery_state))
-        if self.doc_state:
-            domain.append(('doc_state', '=', self.doc_state))
-        if self.only_ready:
-            domain.append(('doc_state', 'in', ['ready', 'sent']))
-        if self.only_not_sent:
-            domain.append(('doc_state', '!=', 'sent'))
-        return self.env['delivery.evidence.control'].search(
-            domain, order='order_date, name')
+    job_id = fields.Many2one('delivery.evidence.report.job', 'Relación', readonly=True)
+    job_state = fields.Selection(related='job_id.state', string='Estado de la relación')
+    download_url = fields.Char(related='job_id.download_url')
+    # Los controles salen del trabajo, no de los filtros actuales: una
+    # relación compartida pudo armarse minutos antes con otros datos.
+    included_ids = fields.Many2many(related='job_id.included_control_ids')
+    package_url = fields.Char(related='job_id.package_url')
 
     def action_generate(self):
+        """Encola la relación; un cron la arma y avisa al terminar."""
         self.ensure_one()
         try:
-            import xlsxwriter
+            import xlsxwriter  # noqa: F401
         except ImportError:
             raise UserError(_('El servidor no tiene disponible la librería xlsxwriter.'))
 
@@ -72,105 +35,16 @@ class DeliveryEvidenceReportWizard(models.TransientModel):
         if not controls:
             raise UserError(_('No hay controles que coincidan con los filtros.'))
 
-        delivery_labels = dict(DELIVERY_STATES)
-        doc_labels = dict(DOC_STATES)
-
-        buffer = io.BytesIO()
-        book = xlsxwriter.Workbook(buffer, {'in_memory': True})
-        sheet = book.add_worksheet('Relación')
-
-        title_fmt = book.add_format({'bold': True, 'font_size': 14, 'font_color': '#14425C'})
-        sub_fmt = book.add_format({'font_color': '#6A7D8A'})
-        head_fmt = book.add_format({
-            'bold': True, 'bg_color': '#14425C', 'font_color': '#FFFFFF',
-            'border': 1, 'text_wrap': True, 'valign': 'vcenter'})
-        date_fmt = book.add_format({'num_format': 'dd/mm/yyyy', 'border': 1})
-        money_fmt = book.add_format({'num_format': '#,##0.00', 'border': 1})
-        qty_fmt = book.add_format({'num_format': '#,##0.00', 'border': 1})
-        pct_fmt = book.add_format({'num_format': '0.0"%"', 'border': 1})
-        cell_fmt = book.add_format({'border': 1})
-        total_fmt = book.add_format({
-            'bold': True, 'num_format': '#,##0.00', 'top': 2, 'bg_color': '#F2F6F9'})
-        total_lbl_fmt = book.add_format({'bold': True, 'top': 2, 'bg_color': '#F2F6F9'})
-
-        company = self.company_id or self.env.company
-        period = _('Periodo: %(f)s a %(t)s') % {
-            'f': self.date_from and self.date_from.strftime('%d/%m/%Y') or '—',
-            't': self.date_to and self.date_to.strftime('%d/%m/%Y') or '—',
-        }
-        sheet.write(0, 0, _('Relación de Entregas y Evidencias — %s') % company.name, title_fmt)
-        sheet.write(1, 0, period, sub_fmt)
-        sheet.write(2, 0, _('Generado el %(d)s por %(u)s') % {
-            'd': fields.Datetime.context_timestamp(
-                self, fields.Datetime.now()).strftime('%d/%m/%Y %H:%M'),
-            'u': self.env.user.name,
-        }, sub_fmt)
-
-        headers = [
-            (_('Fecha pedido'), 11), (_('Orden de venta'), 13), (_('Código cliente'), 13),
-            (_('Razón social'), 32), (_('OC del cliente'), 16),
-            (_('Folios de producción'), 24), (_('Moneda'), 8), (_('Total venta'), 14),
-            (_('Factura Compact'), 15), (_('Fecha factura'), 12), (_('Importe factura'), 14),
-            (_('Cant. pedida'), 12), (_('Cant. entregada'), 12), (_('Cant. pendiente'), 12),
-            (_('% entregado'), 10), (_('Estado entrega'), 14), (_('Estado evidencia'), 18),
-            (_('Fecha evidencia'), 12), (_('Envío a Administración'), 14), (_('Observaciones'), 30),
-        ]
-        header_row = 4
-        for col, (label, width) in enumerate(headers):
-            sheet.write(header_row, col, label, head_fmt)
-            sheet.set_column(col, col, width)
-        sheet.autofilter(header_row, 0, header_row + len(controls), len(headers) - 1)
-        sheet.freeze_panes(header_row + 1, 0)
-
-        row = header_row
-        totals = {'venta': 0.0, 'compact': 0.0, 'ord': 0.0, 'dlv': 0.0, 'pen': 0.0}
-        for control in controls:
-            row += 1
-            sheet.write(row, 0, control.order_date or '', date_fmt)
-            sheet.write(row, 1, control.name or '', cell_fmt)
-            sheet.write(row, 2, control.partner_code or '', cell_fmt)
-            sheet.write(row, 3, control.partner_id.name or '', cell_fmt)
-            sheet.write(row, 4, control.client_order_ref or '', cell_fmt)
-            sheet.write(row, 5, control.production_folios or '', cell_fmt)
-            sheet.write(row, 6, control.currency_id.name or '', cell_fmt)
-            sheet.write(row, 7, control.amount_total, money_fmt)
-            sheet.write(row, 8, control.compact_invoice_folio or '', cell_fmt)
-            sheet.write(row, 9, control.compact_invoice_date or '', date_fmt)
-            sheet.write(row, 10, control.compact_invoice_amount or 0.0, money_fmt)
-            sheet.write(row, 11, control.qty_ordered, qty_fmt)
-            sheet.write(row, 12, control.qty_delivered, qty_fmt)
-            sheet.write(row, 13, control.qty_pending, qty_fmt)
-            sheet.write(row, 14, control.delivered_pct, pct_fmt)
-            sheet.write(row, 15, delivery_labels.get(control.delivery_state, ''), cell_fmt)
-            sheet.write(row, 16, doc_labels.get(control.doc_state, ''), cell_fmt)
-            sheet.write(row, 17, control.evidence_received_date or '', date_fmt)
-            sheet.write(row, 18, control.sent_date and fields.Datetime.context_timestamp(
-                self, control.sent_date).strftime('%d/%m/%Y') or '', cell_fmt)
-            sheet.write(row, 19, control.notes or '', cell_fmt)
-            totals['venta'] += control.amount_total
-            totals['compact'] += control.compact_invoice_amount or 0.0
-            totals['ord'] += control.qty_ordered
-            totals['dlv'] += control.qty_delivered
-            totals['pen'] += control.qty_pending
-
-        row += 1
-        sheet.write(row, 3, _('TOTALES (%s registros)') % len(controls), total_lbl_fmt)
-        for col in (0, 1, 2, 4, 5, 6, 8, 9, 14, 15, 16, 17, 18, 19):
-            sheet.write(row, col, '', total_lbl_fmt)
-        sheet.write(row, 7, totals['venta'], total_fmt)
-        sheet.write(row, 10, totals['compact'], total_fmt)
-        sheet.write(row, 11, totals['ord'], total_fmt)
-        sheet.write(row, 12, totals['dlv'], total_fmt)
-        sheet.write(row, 13, totals['pen'], total_fmt)
-
-        book.close()
-        file_name = 'relacion_entregas_evidencias_%s.xlsx' % fields.Date.context_today(
-            self).strftime('%Y%m%d')
+        job = self.env['delivery.evidence.report.job']._enqueue(dict(
+            self._report_filter_vals(),
+            name=_('Relación %(f)s a %(t)s') % {
+                'f': self.date_from and self.date_from.strftime('%d/%m/%Y') or '—',
+                't': self.date_to and self.date_to.strftime('%d/%m/%Y') or '—',
+            },
+        ))
         self.write({
             'state': 'done',
-            'file': base64.b64encode(buffer.getvalue()),
-            'file_name': file_name,
-            'included_ids': [(6, 0, controls.ids)],
+            'job_id': job.id,
         })
         return {
             'type': 'ir.actions.act_window',
@@ -184,6 +58,9 @@ class DeliveryEvidenceReportWizard(models.TransientModel):
         """Marca como enviados los controles incluidos, solo bajo confirmación
         explícita del responsable (el botón lleva confirm en la vista)."""
         self.ensure_one()
+        if self.job_state != 'done':
+            raise UserError(_('La relación aún no termina de generarse; espera el aviso '
+                              'para marcar los controles incluidos.'))
         ready = self.included_ids.filtered(lambda c: c.doc_state == 'ready')
         if not ready:
             raise UserError(_('Ninguno de los controles incluidos está en estado '
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from datetime import datetime, time
+
 from odoo import fields, models, _
 
 
@@ -14,30 +16,28 @@ class DeliveryEvidenceSyncWizard(models.TransientModel):
     state = fields.Selection(
         [('choose', 'choose'), ('done', 'done')], default='choose')
     result = fields.Text('Resultado', readonly=True)
+    job_id = fields.Many2one('delivery.evidence.sync.job', 'Sincronización', readonly=True)
 
     def action_sync(self):
+        """Encola la sincronización: se procesa por bloques en segundo plano."""
         self.ensure_one()
-        domain = [('state', 'in', ['sale', 'done'])]
-        if self.company_id:
-            domain.append(('company_id', '=', self.company_id.id))
-        if self.date_from:
-            domain.append(('date_order', '>=', self.date_from))
-        if self.date_to:
-            domain.append(('date_order', '<=', self.date_to))
-        if self.partner_ids:
-            domain.append(('partner_id', 'in', self.partner_ids.ids))
-
-        orders = self.env['sale.order'].search(domain)
-        stats = self.env['delivery.evidence.control']._sync_from_orders(orders)
+        job = self.env['delivery.evidence.sync.job']._enqueue({
+            'name': _('Sincronización desde el asistente'),
+            'company_id': self.company_id.id,
+            'date_from': self.date_from and fields.Datetime.to_datetime(self.date_from),
+            # La fecha final incluye todo ese día, como cuando se filtraba por Date.
+            'date_to': self.date_to and datetime.combine(self.date_to, time.max),
+            'partner_ids': [(6, 0, self.partner_ids.ids)],
+        })
         self.write({
             'state': 'done',
+            'job_id': job.id,
             'result': _(
-                'Ventas revisadas: %(total)s\n'
-                'Controles creados: %(created)s\n'
-                'Controles actualizados: %(updated)s\n'
-                'Omitidas (no confirmadas): %(skipped)s\n'
-                'Con inconsistencias (requieren revisión): %(review)s'
-            ) % dict(stats, total=len(orders)),
+                'Ventas a revisar: %(total)s\n'
+                'La sincronización corre en segundo plano por bloques; el avance '
+                '(controles creados, actualizados y con revisión) se consulta en '
+                'Configuración → Sincronizaciones.'
+            ) % {'total': job.total_count},
         })
         return {
             'type': 'ir.actions.act_window',